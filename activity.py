@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import preprocessor
+
+# The activity cube counts messages per (month, weekday, slot of the day), with 15-minute slots;
+# hourly views add up each hour's slots
+SLOTS_PER_HOUR = 4
+SHAPE = (12, 7, 24 * SLOTS_PER_HOUR)
+SIZE = int(np.prod(SHAPE))
+
+
+def bins(dates):
+    """Flat cube position of each timestamp, computed from its datetime64 value."""
+    times = dates.to_numpy(dtype='datetime64[ns]')
+    days = times.astype('datetime64[D]')
+    month = times.astype('datetime64[M]').astype(np.int64) % 12
+    # 1970-01-01 was a Thursday, weekday 3
+    weekday = (days.astype(np.int64) + 3) % 7
+    slot = (times - days).astype('timedelta64[m]').astype(np.int64) * SLOTS_PER_HOUR // 60
+    return (month * SHAPE[1] + weekday) * SHAPE[2] + slot
+
+
+def cube(dates):
+    """Activity cube of a datetime column, as an int64 array of SHAPE."""
+    return np.bincount(bins(dates), minlength=SIZE).reshape(SHAPE)
+
+
+def user_cubes(df):
+    """Activity cube of every user in one bincount pass, as a frame with a row of SIZE counts per user."""
+    codes, users = pd.factorize(df['user'])
+    counts = np.bincount(codes * SIZE + bins(df['date']), minlength=len(users) * SIZE)
+    return pd.DataFrame(counts.reshape(len(users), SIZE), index=pd.Index(np.asarray(users, dtype=object), name='user'))
+
+
+def slot_labels(minutes):
+    if minutes == 60:
+        return preprocessor.PERIODS
+    return [f"{start // 60:02d}:{start % 60:02d}" for start in range(0, 24 * 60, minutes)]
+
+
+def heatmap(counts, minutes=60):
+    """Weekday x time-of-day message counts, Monday first, in 60, 30 or 15 minute columns.
+
+    counts is one activity cube or a stack of them (e.g. one per user), which are added up.
+    """
+    per_column = minutes * SLOTS_PER_HOUR // 60
+    grid = counts.reshape(-1, *SHAPE).sum(axis=(0, 1)).reshape(SHAPE[1], -1, per_column).sum(axis=2)
+    return pd.DataFrame(grid.astype(float), index=pd.Index(preprocessor.DAY_NAMES, name='day_name'),
+                        columns=pd.Index(slot_labels(minutes), name='period'))
+
+
+def ranked(counts, labels, name):
+    # Busiest first, leaving out labels without messages
+    counts = pd.Series(counts, index=pd.Index(labels, name=name), name='count')
+    return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+
+def weekdays(counts):
+    """Messages per weekday name of an activity cube or stack, busiest first."""
+    return ranked(counts.reshape(-1, *SHAPE).sum(axis=(0, 1, 3)), preprocessor.DAY_NAMES, 'day_name')
+
+
+def months(counts):
+    """Messages per month name of an activity cube or stack, busiest first."""
+    return ranked(counts.reshape(-1, *SHAPE).sum(axis=(0, 2, 3)), preprocessor.MONTHS, 'month')
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import tokenizer
+import emoji_extractor
+import links
+import activity
+
+# User under which every aggregate but 'users' also holds the sum over all users
+OVERALL = 'Overall'
+
+# Bumped whenever build changes what it counts, so stored aggregates get rebuilt
+VERSION = 6
+
+
+# Where a word first occurs, as the row of its message in the chat shifted left by POSITION_BITS
+# plus its token number in the message; merge shifts the part appended later past the earlier one
+POSITION_BITS = 20
+
+# Aggregates of word counts and first occurrences, and how their columns combine across users and merged parts
+WORD_AGGREGATES = ('words', 'cloud_words')
+WORD_COLUMNS = {'count': 'sum', 'first': 'min'}
+
+
+def user_word_counts(messages, rows, strip_punctuation=True):
+    # count and first occurrence of each word of one user's messages, found at the given chat rows
+    codes, vocabulary, message, token = tokenizer.word_positions(messages, strip_punctuation=strip_punctuation)
+    words, first = np.unique(codes, return_index=True)
+    return pd.DataFrame({
+        'count': np.bincount(codes, minlength=len(vocabulary))[words],
+        'first': (rows[message[first]] << POSITION_BITS) | np.minimum(token[first], (1 << POSITION_BITS) - 1),
+    }, index=pd.Index(vocabulary[words], dtype=object, name='word'))
+
+
+def word_counts(df, strip_punctuation=True):
+    """Count the words of user messages per (user, word), the way most_common_words tokenizes them,
+    or without strip_punctuation the way the word cloud does.
+
+    Stopwords are not removed here so the counts stay valid for any stopword list. Next to
+    each 'count' is where the word 'first' occurs, so ties can be ordered by first
+    occurrence as tokenizer.count_words does.
+    """
+    mask = ((df['user'] != 'group_notification') & (df['message'] != '<Media omitted>\n')).to_numpy()
+    temp = df[mask].assign(row=np.flatnonzero(mask))
+    counts = {user: user_word_counts(group['message'], group['row'].to_numpy(), strip_punctuation)
+              for user, group in temp.groupby('user')}
+    if not counts:
+        return pd.DataFrame({'count': [], 'first': []}, dtype='int64',
+                            index=pd.MultiIndex.from_tuples([], names=['user', 'word']))
+    return pd.concat(counts, names=['user', 'word']).sort_index()
+
+
+def emoji_counts(df):
+    """Count the emoji of all messages per (user, emoji)."""
+    counts = {user: emoji_extractor.count_emojis(messages) for user, messages in df.groupby('user')['message']}
+    if not counts:
+        return pd.Series([], index=pd.MultiIndex.from_tuples([], names=['user', 'emoji']), dtype='int64')
+    return pd.concat(counts, names=['user', 'emoji']).sort_index()
+
+
+def stat_counts(df, found):
+    """Count messages, words, media and links per (user, stat), the way fetch_stats does."""
+    stats = pd.DataFrame({
+        'user': df['user'],
+        'messages': 1,
+        'words': df['message'].str.split().str.len(),
+        'media': (df['message'] == '<Media omitted>\n').astype('int64'),
+        'links': found.index.value_counts().reindex(df.index, fill_value=0),
+    })
+    return stats.groupby('user').sum().stack().rename_axis(['user', 'stat']).astype('int64')
+
+
+def domain_counts(df, found):
+    """Count links per (user, domain)."""
+    return pd.DataFrame({'user': df['user'].loc[found.index], 'domain': found.map(links.domain)}).groupby(
+        ['user', 'domain']).size()
+
+
+def activity_counts(df):
+    """Activity cube per user (see activity.py), one row each, plus the OVERALL row."""
+    cubes = activity.user_cubes(df)
+    cubes.loc[OVERALL] = cubes.sum()
+    return cubes.sort_index()
+
+
+def with_overall(counts, how='sum'):
+    """Add the sum (or another aggregation) over all users as user OVERALL and sort the index for fast lookups."""
+    overall = counts.groupby(level=list(range(1, counts.index.nlevels))).agg(how)
+    overall = pd.concat({OVERALL: overall}, names=counts.index.names[:1])
+    return pd.concat([counts, overall]).sort_index()
+
+
+def build(df):
+    """Index everything the helper views need, per user and for OVERALL.
+
+    Every aggregate is a Series of counts whose first index level is the user, except
+    'activity', a frame with a row per user, and WORD_AGGREGATES, frames of counts and
+    first occurrences; either way the aggregates of two consecutive parts of a chat can be
+    combined with merge.
+    """
+    # Plain string users so aggregates of chunks with different user categories line up
+    df = df[['date', 'user', 'message']].astype({'user': object})
+    date = df['date']
+    found = links.find_links(df['message'])
+    return {
+        'users': df.groupby('user').size(),
+        'totals': with_overall(stat_counts(df, found)),
+        'domains': with_overall(domain_counts(df, found)),
+        'monthly': with_overall(df.groupby(['user', date.dt.year.rename('year'),
+                                            date.dt.month.rename('month_num')]).size()),
+        'daily': with_overall(df.groupby(['user', date.dt.normalize().rename('day')]).size()),
+        'activity': activity_counts(df),
+        'emojis': with_overall(emoji_counts(df)),
+        'words': with_overall(word_counts(df), WORD_COLUMNS),
+        'cloud_words': with_overall(word_counts(df, strip_punctuation=False), WORD_COLUMNS),
+    }
+
+
+def merge_words(old, new, offset):
+    # Words seen before keep their first occurrence; new ones come after every earlier message
+    new = new.assign(first=new['first'] + offset)
+    return pd.concat([old, new]).groupby(level=[0, 1]).agg(WORD_COLUMNS).astype('int64').sort_index()
+
+
+def merge(old, new):
+    """Combine the aggregates of a chat with those of messages appended to it."""
+    offset = int(old['users'].sum()) << POSITION_BITS
+    return {name: merge_words(old[name], new[name], offset) if name in WORD_AGGREGATES
+            else old[name].add(new[name], fill_value=0).astype('int64').sort_index() for name in old}
+
+
+def for_user(counts, selected_user):
+    """Return an aggregate for one user, or for all users with 'Overall', without the user level."""
+    if selected_user not in counts.index.get_level_values(0):
+        return counts.iloc[:0].droplevel(0)
+    return counts.xs(selected_user, level=0)
@@ -3,7 +3,6 @@ from PIL import Image
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from textblob import TextBlob
 import helper
 import preprocessor
 import openai
@@ -12,7 +11,16 @@ from io import BytesIO  # Import BytesIO
 from docx import Document
 from io import StringIO
 from docx.shared import Inches
+import time
 from datetime import datetime
+from concurrent.futures import as_completed
+import chat_store
+import date_index
+import sentiment
+import sessions
+import pipeline
+import workers
+import jobs
 
 
 
@@ -44,11 +52,6 @@ def main():
 
 
 
-# Function to save Plotly figures as images
-def save_plot_as_image(fig, filename):
-    fig.write_image(filename, format='png')
-
-
 # Function to generate Word report
 def generate_word_report(num_messages, words, num_media_messages, num_links, most_used_words_df, emoji_df,
                          sentiment_counts,
@@ -121,18 +124,8 @@ def generate_csv_report(num_messages, words, num_media_messages, num_links, most
 
 def analyze_sentiments(df):
     """Function to analyze sentiment of the messages"""
-
-    def get_sentiment(text):
-        analysis = TextBlob(text)
-        if analysis.sentiment.polarity > 0:
-            return 'Positive'
-        elif analysis.sentiment.polarity < 0:
-            return 'Negative'
-        else:
-            return 'Neutral'
-
-    df['sentiment'] = df['message'].apply(get_sentiment)
-    sentiment_counts = df['sentiment'].value_counts()
+    # Scored once per distinct message and remembered across calls
+    sentiment_counts = sentiment.sentiment_counts(df['message'])
     return sentiment_counts
 
 
@@ -162,6 +155,188 @@ def get_most_active_days(df):
     return most_active_days_df
 
 
+def monthly_timeline_figure(timeline):
+    return px.line(timeline, x='time', y='message', title='Monthly Chats',
+                   labels={'time': 'Months', 'message': 'Number of Chats'}, template='plotly_dark')
+
+
+def timeline_title(daily_timeline):
+    # Long ranges come in weekly, monthly or quarterly buckets
+    granularity = daily_timeline.attrs.get('granularity', 'day')
+    return 'Daily Chats' if granularity == 'day' else f'Chats per {granularity.capitalize()}'
+
+
+def daily_timeline_figure(daily_timeline):
+    return px.line(daily_timeline, x='only_date', y='message', title=timeline_title(daily_timeline),
+                   labels={'only_date': 'Date', 'message': 'Number of Chats'}, template='plotly_dark')
+
+
+def most_used_words_figure(most_used_words_df):
+    return px.bar(most_used_words_df.head(10), x='Word', y='Count', title='Top 10 Most Used Words',
+                  labels={'Word': 'Words', 'Count': 'Frequency'}, template='plotly_dark')
+
+
+def emoji_figure(emoji_df):
+    fig = go.Figure(data=[go.Pie(labels=emoji_df['Emoji'].head(), values=emoji_df['Count'].head(), hole=0.3)])
+    fig.update_layout(title="Emoji Distribution")
+    return fig
+
+
+def sentiment_figure(sentiment_counts):
+    return px.pie(sentiment_counts, values='count', names=sentiment_counts.index,
+                  title='Sentiment Analysis Distribution', template='plotly_dark')
+
+
+def most_active_users_figure(most_active_users):
+    x, _ = most_active_users
+    return px.bar(x, x.index, x.values, title='Top Active User',
+                  labels={'x': 'Users', 'y': 'Number of Chats'}, template='plotly_dark')
+
+
+def wordcloud_figure(wordcloud):
+    return px.imshow(wordcloud, title='WordCloud', labels={'x': '', 'y': ''}, template='plotly_dark')
+
+
+def most_active_days_figure(most_active_days_df):
+    return px.bar(most_active_days_df.head(10), x='date', y='message_count', title='Top 10 Most Active Days',
+                  labels={'date': 'Date', 'message_count': 'Message Count'}, template='plotly_dark')
+
+
+# Charts of the Word report, in report order, and the PNG results they are exported to
+REPORT_FIGURES = ('monthly_timeline_figure', 'daily_timeline_figure', 'most_used_words_figure', 'emoji_figure',
+                  'sentiment_figure', 'most_active_days_figure')
+REPORT_IMAGES = tuple(name.replace('_figure', '_png') for name in REPORT_FIGURES)
+
+
+def csv_report(stats, most_used_words_df, emoji_df, sentiment_counts):
+    return generate_csv_report(*stats, most_used_words_df, emoji_df, sentiment_counts)
+
+
+def word_report(stats, most_used_words_df, emoji_df, sentiment_counts, *images):
+    # Each chart is read from its own buffer, so concurrent sessions never share image files
+    return generate_word_report(*stats, most_used_words_df, emoji_df, sentiment_counts,
+                                *(BytesIO(image) for image in images)).getvalue()
+
+
+# Reports offered for download: (label, result name, file name, MIME type)
+REPORTS = (
+    ('CSV', 'csv_report', 'chat_analysis_report.csv', 'text/csv'),
+    ('Word', 'word_report', 'chat_analysis_report.docx',
+     'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+)
+
+# Seconds between checks on running report jobs
+REPORT_POLL_SECONDS = 1
+
+# What the All Analysis view shows, started together
+ALL_ANALYSIS = ['fetch_stats', 'monthly_timeline_figure', 'daily_timeline_figure', 'most_used_words_figure',
+                'most_active_users_figure', 'wordcloud_figure', 'emojis', 'emoji_figure', 'sentiment_figure',
+                'most_active_days_figure']
+
+# Everything the views and reports show, name -> (function, names of the results it takes).
+# chat_hash, selected_user, df and aggregates are the inputs of each pipeline.Pipeline.
+USER_DATA = ('selected_user', 'df', 'aggregates')
+METRICS = {
+    'fetch_stats': (helper.fetch_stats, USER_DATA),
+    'link_domains': (helper.link_domains, USER_DATA),
+    'monthly_timeline': (helper.monthly_timeline, USER_DATA),
+    'daily_timeline': (helper.daily_timeline, USER_DATA),
+    'most_active_users': (helper.most_active_users, ('df', 'aggregates')),
+    # Kept as the rendered image array, which px.imshow takes directly; laid out in a worker process
+    'wordcloud': (helper.wordcloud_image, USER_DATA + ('chat_hash',)),
+    'emojis': (helper.emojis, USER_DATA),
+    'most_used_words': (get_most_used_words, ('df',)),
+    'sentiments': (analyze_sentiments, ('df',)),
+    'most_active_days': (get_most_active_days, ('df',)),
+    'conversation_sessions': (helper.conversation_sessions, ('selected_user', 'df')),
+    'replies': (sessions.replies, ('df',)),
+    'response_times': (helper.response_times, ('selected_user', 'df', 'replies')),
+    'reply_pairs': (helper.reply_pairs, ('selected_user', 'df', 'replies')),
+    'monthly_timeline_figure': (monthly_timeline_figure, ('monthly_timeline',)),
+    'daily_timeline_figure': (daily_timeline_figure, ('daily_timeline',)),
+    'most_used_words_figure': (most_used_words_figure, ('most_used_words',)),
+    'emoji_figure': (emoji_figure, ('emojis',)),
+    'sentiment_figure': (sentiment_figure, ('sentiments',)),
+    'most_active_days_figure': (most_active_days_figure, ('most_active_days',)),
+    'most_active_users_figure': (most_active_users_figure, ('most_active_users',)),
+    'wordcloud_figure': (wordcloud_figure, ('wordcloud',)),
+    'csv_report': (csv_report, ('fetch_stats', 'most_used_words', 'emojis', 'sentiments')),
+    # The same figure objects as on screen, exported side by side in worker processes when there are several
+    **{image: (helper.figure_png, (figure,), 'process') for figure, image in zip(REPORT_FIGURES, REPORT_IMAGES)},
+    'word_report': (word_report, ('fetch_stats', 'most_used_words', 'emojis', 'sentiments') + REPORT_IMAGES),
+}
+
+# Number of parsed chats and of (chat, user) analysis results kept in memory; the least recently used go first
+MAX_CACHED_CHATS = 4
+MAX_CACHED_ANALYSES = 64
+
+
+def upload_hash(uploaded_file):
+    """Return the SHA-256 of an upload's content, hashing each uploaded file only once per session."""
+    hashes = st.session_state.setdefault('upload_hashes', {})
+    if uploaded_file.file_id not in hashes:
+        with uploaded_file.getbuffer() as data:
+            hashes[uploaded_file.file_id] = chat_store.content_hash(data)
+    return hashes[uploaded_file.file_id]
+
+
+@st.cache_resource(max_entries=MAX_CACHED_CHATS, show_spinner="Parsing chat...")
+def load_chat(chat_hash, _uploaded_file):
+    """Parse an upload; the result is shared by every rerun and session that uploads the same content.
+
+    Chats parsed before, also in earlier sessions, come from the on-disk chat_store.
+    """
+    # Date-part columns are only derived when a view asks for them
+    return chat_store.load_or_parse(_uploaded_file, chat_hash, compact=True, lazy=True)
+
+
+@st.cache_resource(max_entries=MAX_CACHED_CHATS, show_spinner="Counting messages...")
+def load_aggregates(chat_hash, _df):
+    """Per-user counts of a chat (see aggregates.py), kept up to date incrementally by chat_store."""
+    return chat_store.load_or_build_aggregates(chat_hash, _df)
+
+
+@st.cache_resource(max_entries=MAX_CACHED_CHATS, show_spinner=False)
+def load_date_index(chat_hash, _df):
+    """The chat's messages sorted by time once, for the date range filters (see date_index.py)."""
+    return date_index.DateIndex(_df)
+
+
+@st.cache_resource(max_entries=MAX_CACHED_ANALYSES, show_spinner=False)
+def analysis_results(chat_hash, selected_user, _df, _aggregates):
+    """The METRICS of one chat and user; each is computed once, when a view first asks for it."""
+    return pipeline.Pipeline(METRICS, chat_hash=chat_hash, selected_user=selected_user, df=_df, aggregates=_aggregates)
+
+
+@st.fragment
+def report_downloads(chat_hash, selected_user, results):
+    """Build each report as a background job and offer it for download once it is done.
+
+    Only this fragment reruns while jobs are running, so the rest of the page stays usable;
+    once every job has finished it stops rerunning. A finished report stays with its job
+    and is downloaded again without being rebuilt.
+    """
+    running = False
+    for label, name, file_name, mime in REPORTS:
+        job = jobs.start((chat_hash, selected_user), results, name)
+        if job.status == 'done':
+            st.download_button(label=f'Download {label}', data=job.artifact(), file_name=file_name, mime=mime,
+                               key=job.id)
+        elif job.status == 'running':
+            st.progress(job.progress(), text=f'Preparing the {label} report...')
+            running = True
+        else:
+            st.error(f'The {label} report could not be built: {job.future.exception()}')
+            if st.button(f'Retry {label}', key=f'retry-{job.id}'):
+                jobs.start((chat_hash, selected_user), results, name, retry=True)
+                running = True
+
+    if running:
+        # Check the jobs again shortly
+        time.sleep(REPORT_POLL_SECONDS)
+        st.rerun(scope='fragment')
+
+
 def load_css(css_path):
     with open(css_path, "r") as f:
         css = f.read()
@@ -303,9 +478,14 @@ def main():
 
         # Check if a file has been uploaded
         if uploaded_file:
-            bytes_data = uploaded_file.getvalue()
-            data = bytes_data.decode("utf-8")
-            df = preprocessor.preprocess(data)  # Assuming preprocessor has a method named preprocess
+            # Parsing and analyses are cached by content, so reruns for the same upload reuse them
+            chat_hash = upload_hash(uploaded_file)
+            try:
+                df = load_chat(chat_hash, uploaded_file)
+                aggregates = load_aggregates(chat_hash, df)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
 
             # Display a message indicating analysis generation
             st.markdown('<p style="font-family:Roboto; color:#ffa81a; font-size: 20px; font-weight: bold">Here is your analysis generated:</p>', unsafe_allow_html=True)
@@ -319,6 +499,7 @@ def main():
 
             # Sidebar selectbox for user selection
             selected_user = st.sidebar.selectbox("Show analysis with respect to", user_list)
+            results = analysis_results(chat_hash, selected_user, df, aggregates)
 
             # Further analysis logic based on the selected user can be added here
 
@@ -327,7 +508,7 @@ def main():
             visualization_option = st.sidebar.selectbox(
                 "Select Visualization",
                 ["Select", "Chat Data", "Top Chat Statistics", "Monthly Timeline", "Daily Timeline",
-                 "Most Used Words", "Most Active Users", "WordCloud", "Emoji Analysis", "Sentiment Analysis", "Most Active Days", "All Analysis"]
+                 "Most Used Words", "Most Active Users", "WordCloud", "Emoji Analysis", "Sentiment Analysis", "Most Active Days", "Conversations", "All Analysis"]
             )
 
             if st.sidebar.button("Show Analysis"):
@@ -341,11 +522,12 @@ def main():
                         '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">Here is the raw chat data you uploaded:</p>',
                         unsafe_allow_html=True
                     )
-                    st.dataframe(df)
+                    # Derived on a shallow copy: the cached frame is shared by every session and the analysis threads
+                    st.dataframe(preprocessor.derive(df.copy(deep=False), *preprocessor.DERIVED_COLUMNS))
 
                 elif visualization_option == "Top Chat Statistics":
                     # Stats Area
-                    num_messages, words, num_media_messages, num_links = helper.fetch_stats(selected_user, df)
+                    num_messages, words, num_media_messages, num_links = results['fetch_stats']
 
                     st.markdown(
                         '<u><p style="font-family:Roboto; color:#5e76c4; font-size: 50px; font-weight: bold">Top Chat Statistics</p></u>',
@@ -378,20 +560,15 @@ def main():
                         )
                         st.title(num_links)
 
-                elif visualization_option == "Monthly Timeline":
-
-                    # Sample DataFrame for monthly timeline analysis (replace with your helper function)
-                    # Assuming the 'time' column is in 'YYYY-MM-DD' format
-                    def mock_monthly_timeline(selected_user, df):
-                        return pd.DataFrame({
-                            'time': pd.date_range(start='2022-01-01', periods=24, freq='M'),  # Mock dates
-                            'message': [i * 10 for i in range(24)]  # Mock message counts
-                        })
+                    if num_links:
+                        st.markdown(
+                            '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">Links shared per website:</p>',
+                            unsafe_allow_html=True
+                        )
+                        st.dataframe(results['link_domains'])
 
-                    # Replace with your actual data and function
-                    df = pd.DataFrame()  # Placeholder
-                    selected_user = "User"  # Placeholder
-                    timeline = mock_monthly_timeline(selected_user, df)
+                elif visualization_option == "Monthly Timeline":
+                    timeline = results['monthly_timeline']
 
                     # Streamlit page structure
                     st.markdown(
@@ -403,47 +580,35 @@ def main():
                         unsafe_allow_html=True
                     )
 
-                    # Date input for selecting a full start and end date
-                    start_date = st.date_input("Select start date (default day is 1)", value=datetime(2023, 1, 1))
-                    end_date = st.date_input("Select end date (default day is 1)", value=datetime(2023, 12, 1))
-
-                    # Extract month and year from the selected dates
-                    start_month_year = datetime(start_date.year, start_date.month, 1)
-                    end_month_year = datetime(end_date.year, end_date.month, 1)
-
-                    # Convert 'time' column to datetime if not already in that format
-                    timeline['time'] = pd.to_datetime(timeline['time'])
-
-                    # Filter based on the selected start and end month-year
-                    filtered_timeline = timeline[
-                        (timeline['time'] >= start_month_year) & (timeline['time'] <= end_month_year)]
-
-                    # Plot the filtered data using bar chart
-                    fig = px.bar(
-                        filtered_timeline,
-                        x='time',
-                        y='message',
-                        title='Monthly Chats',
-                        labels={'time': 'Months', 'message': 'Number of Chats'},
-                        template='plotly_dark'
-                    )
-                    st.plotly_chart(fig)
+                    if timeline.empty:
+                        st.info("No messages to show.")
+                    else:
+                        # Date input for selecting a full start and end date, within the chat by default
+                        first = datetime(timeline['year'].iloc[0], timeline['month_num'].iloc[0], 1)
+                        last = datetime(timeline['year'].iloc[-1], timeline['month_num'].iloc[-1], 1)
+                        start_date = st.date_input("Select start date (default day is 1)", value=first)
+                        end_date = st.date_input("Select end date (default day is 1)", value=last)
+
+                        # Months are counted from the whole chat, so only the selected ones need to be shipped
+                        start_month_year = datetime(start_date.year, start_date.month, 1)
+                        end_month_year = pd.Timestamp(end_date.year, end_date.month, 1) + pd.offsets.MonthEnd()
+                        filtered_timeline = helper.monthly_timeline(selected_user, df, aggregates,
+                                                                    start_month_year, end_month_year)
+
+                        # Plot the filtered data using bar chart
+                        fig = px.bar(
+                            filtered_timeline,
+                            x='time',
+                            y='message',
+                            title='Monthly Chats',
+                            labels={'time': 'Months', 'message': 'Number of Chats'},
+                            template='plotly_dark'
+                        )
+                        st.plotly_chart(fig)
 
                 elif visualization_option == "Daily Timeline":
-
-                    # Assuming helper.daily_timeline returns a DataFrame with 'only_date' and 'message' columns
-                    daily_timeline = helper.daily_timeline(selected_user, df)
-
-                    # Convert 'only_date' to datetime with flexible parsing
-                    # Use 'dayfirst=True' to prioritize day-first format, and 'errors' to coerce invalid dates
-                    daily_timeline['only_date'] = pd.to_datetime(daily_timeline['only_date'], format='mixed',
-                                                                 dayfirst=True, errors='coerce')
-
-                    # Drop rows with invalid dates (if any)
-                    daily_timeline = daily_timeline.dropna(subset=['only_date'])
-
-                    # Ensure the timeline is sorted by date for proper plotting
-                    daily_timeline = daily_timeline.sort_values(by='only_date')
+                    # Dates of the whole chat, sorted, for the bounds of the range filter
+                    days = helper.date_counts(selected_user, df, aggregates).index
 
                     # Add date range filter
                     st.markdown(
@@ -453,24 +618,27 @@ def main():
                         '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This status shows the total number of chats per day in group or personal.</p>',
                         unsafe_allow_html=True)
 
-                    # Date input widgets for selecting range
-                    start_date = st.date_input("Select start date", value=daily_timeline['only_date'].min().date())
-                    end_date = st.date_input("Select end date", value=daily_timeline['only_date'].max().date())
+                    if days.empty:
+                        st.info("No messages to show.")
+                    else:
+                        # Date input widgets for selecting range
+                        start_date = st.date_input("Select start date", value=days[0].date())
+                        end_date = st.date_input("Select end date", value=days[-1].date())
 
-                    # Filter the DataFrame based on the selected date range
-                    filtered_timeline = daily_timeline[(daily_timeline['only_date'] >= pd.to_datetime(start_date)) &
-                                                       (daily_timeline['only_date'] <= pd.to_datetime(end_date))]
+                        # Bucketed by day, week, month or quarter depending on the range, and downsampled
+                        filtered_timeline = helper.daily_timeline(selected_user, df, aggregates,
+                                                                  pd.Timestamp(start_date), pd.Timestamp(end_date))
 
-                    # Plotting the filtered data as a bar graph
-                    fig = px.bar(filtered_timeline, x='only_date', y='message', title='Daily Chats',
-                                 labels={'only_date': 'Date', 'message': 'Number of Chats'}, template='plotly_dark')
+                        # Plotting the filtered data as a bar graph
+                        fig = px.bar(filtered_timeline, x='only_date', y='message', title=timeline_title(filtered_timeline),
+                                     labels={'only_date': 'Date', 'message': 'Number of Chats'}, template='plotly_dark')
 
-                    # Display the plot
-                    st.plotly_chart(fig)
+                        # Display the plot
+                        st.plotly_chart(fig)
 
                 elif visualization_option == "Most Used Words":
                     # Most Used Words using Plotly
-                    most_used_words_df = get_most_used_words(df)
+                    most_used_words_df = results['most_used_words']
                     st.markdown(
                         '<br><br><u><p style="font-family:Roboto; color:#ca124d; font-size: 40px; font-weight: bold">Most Used Words</p></u>',
                         unsafe_allow_html=True
@@ -484,15 +652,10 @@ def main():
                     st.plotly_chart(fig)
 
                 elif visualization_option == "Most Active Users":
-                    # Convert date inputs to datetime64[ns]
-                    start_date = pd.to_datetime(st.date_input('Start Date', pd.to_datetime(df['date'].min())))
-                    end_date = pd.to_datetime(st.date_input('End Date', pd.to_datetime(df['date'].max())))
-
-                    # Ensure 'date' column in DataFrame is of type datetime64[ns]
-                    df['date'] = pd.to_datetime(df['date'])
-
-                    # Filter the DataFrame based on the selected date range
-                    filtered_df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+                    # Range counts come from the chat's sorted date index, without filtering the frame
+                    index = load_date_index(chat_hash, df)
+                    start_date = st.date_input('Start Date', index.first())
+                    end_date = st.date_input('End Date', index.last())
 
                     if selected_user == 'Overall':
                         st.markdown(
@@ -504,8 +667,9 @@ def main():
                             unsafe_allow_html=True
                         )
 
-                        # Pass the filtered DataFrame to your helper function
-                        x, new_df = helper.most_active_users(filtered_df)
+                        # Messages per user in the selected days, end date included
+                        x, new_df = helper.user_shares(
+                            index.user_counts(start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1)))
 
                         fig = px.bar(x, x.index, x.values, title='Top 5 Active Users',
                                      labels={'x': 'Users', 'y': 'Number of Chats'}, template='plotly_dark')
@@ -520,7 +684,7 @@ def main():
                         '<br><br><u><p style="font-family:Roboto; color:#ca124d; font-size: 40px; font-weight: bold">WordCloud</p></u>',
                         unsafe_allow_html=True
                     )
-                    df_wc = helper.create_wordcloud(selected_user, df)
+                    df_wc = results['wordcloud']
                     fig = px.imshow(df_wc, title='WordCloud', labels={'x': '', 'y': ''}, template='plotly_dark')
                     st.plotly_chart(fig)
 
@@ -534,7 +698,7 @@ def main():
                         '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This stats show most used emoji in the chats.</p>',
                         unsafe_allow_html=True
                     )
-                    emoji_df = helper.emojis(selected_user, df)
+                    emoji_df = results['emojis']
                     col1, col2 = st.columns(2)
 
                     with col1:
@@ -555,7 +719,7 @@ def main():
                         '<br><br><u><p style="font-family:Roboto; color:#ca124d; font-size: 40px; font-weight: bold">Sentiment Analysis</p></u>',
                         unsafe_allow_html=True
                     )
-                    sentiment_counts = analyze_sentiments(df)
+                    sentiment_counts = results['sentiments']
                     fig = px.pie(sentiment_counts, values='count', names=sentiment_counts.index,
                                  title='Sentiment Analysis Distribution', template='plotly_dark')
                     st.plotly_chart(fig)
@@ -570,54 +734,83 @@ def main():
                         '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This bar chart displays the days with the highest message count.</p>',
                         unsafe_allow_html=True
                     )
-                    most_active_days_df = get_most_active_days(df)
+                    most_active_days_df = results['most_active_days']
                     fig = px.bar(most_active_days_df.head(10), x='date', y='message_count',
                                  title='Top 10 Most Active Days',
                                  labels={'date': 'Date', 'message_count': 'Message Count'}, template='plotly_dark')
                     st.plotly_chart(fig)
 
+                elif visualization_option == "Conversations":
+                    # Conversation sessions and reply times
+                    conversation_sessions = results['conversation_sessions']
+                    response_times = results['response_times']
+                    st.markdown(
+                        '<br><br><u><p style="font-family:Roboto; color:#ca124d; font-size: 40px; font-weight: bold">Conversations</p></u>',
+                        unsafe_allow_html=True
+                    )
+                    st.markdown(
+                        f'<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">A conversation ends after {int(sessions.IDLE_GAP.total_seconds() // 60)} minutes without messages. A reply is a message answering another user within a conversation.</p>',
+                        unsafe_allow_html=True
+                    )
+
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.markdown(
+                            '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Conversations</p>',
+                            unsafe_allow_html=True
+                        )
+                        st.title(len(conversation_sessions))
+                    with col2:
+                        st.markdown(
+                            '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Messages per Conversation</p>',
+                            unsafe_allow_html=True
+                        )
+                        st.title(round(conversation_sessions['messages'].mean(), 1) if len(conversation_sessions) else 0)
+                    with col3:
+                        st.markdown(
+                            '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Median Conversation</p>',
+                            unsafe_allow_html=True
+                        )
+                        st.title(str(conversation_sessions['duration'].median()).split('.')[0] if len(conversation_sessions) else '-')
+
+                    fig = px.bar(response_times, x=response_times.index, y='median_minutes', title='Median Reply Time',
+                                 labels={'user': 'Users', 'median_minutes': 'Minutes'}, template='plotly_dark')
+                    st.plotly_chart(fig)
+                    st.dataframe(response_times)
+
+                    reply_pairs = results['reply_pairs']
+                    fig = px.imshow(reply_pairs, title='Who Replies to Whom',
+                                    labels={'x': 'Replied to', 'y': 'User', 'color': 'Replies'}, template='plotly_dark')
+                    st.plotly_chart(fig)
 
+                    st.dataframe(conversation_sessions.sort_values('start', ascending=False))
 
                  #all anaylsis page
                 elif visualization_option == "All Analysis":
                     if visualization_option == "All Analysis":
-                        # Stats Area
-                        num_messages, words, num_media_messages, num_links = helper.fetch_stats(selected_user, df)
+                        # Start every result at once; each chart is drawn as soon as its result arrives
+                        shown = ALL_ANALYSIS if selected_user == 'Overall' else [
+                            name for name in ALL_ANALYSIS if name != 'most_active_users_figure']
+                        pending = {results.submit(name, workers.thread_pool(), workers.process_pool()): name
+                                   for name in shown}
+                        slots = {}
 
+                        # Stats Area
                         st.markdown(
                             '<u><p style="font-family:Roboto; color:#5e76c4; font-size: 50px; font-weight: bold">Top Chat Statistics</p></u>',
                             unsafe_allow_html=True
                         )
 
                         col1, col2, col3, col4 = st.columns([1, 1, 1, 1])  # Equal-width columns
+                        stat_slots = []
 
-                        with col1:
-                            st.markdown(
-                                '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Total Messages</p>',
-                                unsafe_allow_html=True
-                            )
-                            st.title(num_messages)
-
-                        with col2:
-                            st.markdown(
-                                '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Total Words</p>',
-                                unsafe_allow_html=True
-                            )
-                            st.title(words)
-
-                        with col3:
-                            st.markdown(
-                                '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Media Shared</p>',
-                                unsafe_allow_html=True
-                            )
-                            st.title(num_media_messages)
-
-                        with col4:
-                            st.markdown(
-                                '<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">Links Shared</p>',
-                                unsafe_allow_html=True
-                            )
-                            st.title(num_links)
+                        for col, label in zip((col1, col2, col3, col4), ('Total Messages', 'Total Words', 'Media Shared', 'Links Shared')):
+                            with col:
+                                st.markdown(
+                                    f'<p style="font-family:Roboto; color:#12ca7d; font-size: 30px; font-weight: bold">{label}</p>',
+                                    unsafe_allow_html=True
+                                )
+                                stat_slots.append(st.empty())
 
                         # Visualization Layout: 2x2 Grid
                         col1, col2 = st.columns([1, 1])  # Equal-width columns
@@ -632,11 +825,7 @@ def main():
                                 '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This status shows total number of chats per month in group or personal.</p>',
                                 unsafe_allow_html=True
                             )
-                            timeline = helper.monthly_timeline(selected_user, df)
-                            fig = px.line(timeline, x='time', y='message', title='Monthly Chats',
-                                          labels={'time': 'Months', 'message': 'Number of Chats'},
-                                          template='plotly_dark')
-                            st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                            slots['monthly_timeline_figure'] = st.empty()
 
                         with col2:
                             # Daily Timeline
@@ -648,11 +837,7 @@ def main():
                                 '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This status shows total number of chats per day in group or personal.</p>',
                                 unsafe_allow_html=True
                             )
-                            daily_timeline = helper.daily_timeline(selected_user, df)
-                            fig = px.line(daily_timeline, x='only_date', y='message', title='Daily Chats',
-                                          labels={'only_date': 'Date', 'message': 'Number of Chats'},
-                                          template='plotly_dark')
-                            st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                            slots['daily_timeline_figure'] = st.empty()
 
                         # Second Row: Most Used Words and Most Active Users
                         col1, col2 = st.columns([1, 1])  # Equal-width columns
@@ -667,11 +852,7 @@ def main():
                                 '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">Here are the most frequently used words in your chat.</p>',
                                 unsafe_allow_html=True
                             )
-                            most_used_words_df = get_most_used_words(df)
-                            fig = px.bar(most_used_words_df.head(10), x='Word', y='Count',
-                                         title='Top 10 Most Used Words',
-                                         labels={'Word': 'Words', 'Count': 'Frequency'}, template='plotly_dark')
-                            st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                            slots['most_used_words_figure'] = st.empty()
 
                         with col2:
                             # Most Active Users
@@ -684,10 +865,7 @@ def main():
                                     '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This stats shows the most active users in the group.</p>',
                                     unsafe_allow_html=True
                                 )
-                                x, new_df = helper.most_active_users(df)
-                                fig = px.bar(x, x.index, x.values, title='Top Active User',  # Updated title
-                                             labels={'x': 'Users', 'y': 'Number of Chats'}, template='plotly_dark')
-                                st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                                slots['most_active_users_figure'] = st.empty()
 
                         # Second Part: WordCloud, Emoji Analysis, Sentiment Analysis, Most Active Days
 
@@ -700,9 +878,7 @@ def main():
                                 '<br><br><u><p style="font-family:Roboto; color:#ca124d; font-size: 40px; font-weight: bold">WordCloud</p></u>',
                                 unsafe_allow_html=True
                             )
-                            df_wc = helper.create_wordcloud(selected_user, df)
-                            fig = px.imshow(df_wc, title='WordCloud', labels={'x': '', 'y': ''}, template='plotly_dark')
-                            st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                            slots['wordcloud_figure'] = st.empty()
 
                         with col2:
                             # Emoji Analysis
@@ -714,20 +890,13 @@ def main():
                                 '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This stats show most used emoji in the chats.</p>',
                                 unsafe_allow_html=True
                             )
-                            emoji_df = helper.emojis(selected_user, df)
                             col1_emoji, col2_emoji = st.columns([1, 1])  # Sub-grid for emoji analysis
 
                             with col1_emoji:
-                                st.dataframe(emoji_df)
+                                slots['emojis'] = st.empty()
 
                             with col2_emoji:
-                                fig = go.Figure(data=[go.Pie(
-                                    labels=emoji_df['Emoji'].head(),  # Adjust column name
-                                    values=emoji_df['Count'].head(),  # Adjust column name
-                                    hole=0.3
-                                )])
-                                fig.update_layout(title="Emoji Distribution")
-                                st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                                slots['emoji_figure'] = st.empty()
 
                         # Second Row: Sentiment Analysis and Most Active Days
                         col1, col2 = st.columns([1, 1])  # Second row of the grid
@@ -738,10 +907,7 @@ def main():
                                 '<br><br><u><p style="font-family:Roboto; color:#ca124d; font-size: 40px; font-weight: bold">Sentiment Analysis</p></u>',
                                 unsafe_allow_html=True
                             )
-                            sentiment_counts = analyze_sentiments(df)
-                            fig = px.pie(sentiment_counts, values='count', names=sentiment_counts.index,
-                                         title='Sentiment Analysis Distribution', template='plotly_dark')
-                            st.plotly_chart(fig, use_container_width=True)  # Responsive width
+                            slots['sentiment_figure'] = st.empty()
 
                         with col2:
                             # Most Active Days Bar Chart
@@ -753,73 +919,21 @@ def main():
                                 '<p style="font-family:Roboto; color:#ffa81a; font-size: 15px; font-weight: bold">This bar chart displays the days with the highest message count.</p>',
                                 unsafe_allow_html=True
                             )
-                            most_active_days_df = get_most_active_days(df)
-                            fig = px.bar(most_active_days_df.head(10), x='date', y='message_count',
-                                         title='Top 10 Most Active Days',
-                                         labels={'date': 'Date', 'message_count': 'Message Count'},
-                                         template='plotly_dark')
-                            st.plotly_chart(fig, use_container_width=True)  # Responsive width
-                        # CSV download button
-                        csv_report = generate_csv_report(num_messages, words, num_media_messages, num_links,
-                                                         most_used_words_df, emoji_df, sentiment_counts)
-                        st.download_button(
-                            label='Download CSV',
-                            data=csv_report,
-                            file_name='chat_analysis_report.csv',
-                            mime='text/csv'
-                        )
-
-                        # Save charts as images
-                        save_plot_as_image(px.line(helper.monthly_timeline(selected_user, df), x='time', y='message',
-                                                   title='Monthly Chats',
-                                                   labels={'time': 'Months', 'message': 'Number of Chats'},
-                                                   template='plotly_dark'),
-                                           'monthly_timeline.png')
-
-                        save_plot_as_image(px.line(helper.daily_timeline(selected_user, df), x='only_date', y='message',
-                                                   title='Daily Chats',
-                                                   labels={'only_date': 'Date', 'message': 'Number of Chats'},
-                                                   template='plotly_dark'),
-                                           'daily_timeline.png')
-
-                        save_plot_as_image(px.bar(get_most_used_words(df).head(10), x='Word', y='Count',
-                                                  title='Top 10 Most Used Words',
-                                                  labels={'Word': 'Words', 'Count': 'Frequency'},
-                                                  template='plotly_dark'),
-                                           'most_used_words.png')
-
-                        save_plot_as_image(
-                            go.Figure(data=[go.Pie(labels=helper.emojis(selected_user, df)['Emoji'].head(),
-                                                   values=helper.emojis(selected_user, df)['Count'].head(), hole=0.3)]),
-                            'emoji_analysis.png')
-
-                        save_plot_as_image(
-                            px.pie(analyze_sentiments(df), values='count', names=analyze_sentiments(df).index,
-                                   title='Sentiment Analysis Distribution', template='plotly_dark'),
-                            'sentiment_analysis.png')
-
-                        save_plot_as_image(px.bar(get_most_active_days(df).head(10), x='date', y='message_count',
-                                                  title='Top 10 Most Active Days',
-                                                  labels={'date': 'Date', 'message_count': 'Message Count'},
-                                                  template='plotly_dark'),
-                                           'most_active_days.png')
-
-                        # Generate Word report
-                        word_report = generate_word_report(num_messages, words, num_media_messages, num_links,
-                                                           most_used_words_df, emoji_df, sentiment_counts,
-                                                           'monthly_timeline.png', 'daily_timeline.png',
-                                                           'most_used_words.png',
-                                                           'emoji_analysis.png', 'sentiment_analysis.png',
-                                                           'most_active_days.png')
-
-                        # Provide the download button for the Word report
-                        st.download_button(
-                            label='Download Word',
-                            data=word_report,
-                            file_name='chat_analysis_report.docx',
-                            mime='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                        )
-
+                            slots['most_active_days_figure'] = st.empty()
+
+                        # Fill the slots in whatever order the results finish
+                        for future in as_completed(pending):
+                            name = pending[future]
+                            if name == 'fetch_stats':
+                                for slot, value in zip(stat_slots, future.result()):
+                                    slot.title(value)
+                            elif name == 'emojis':
+                                slots[name].dataframe(future.result())
+                            elif name in slots:
+                                slots[name].plotly_chart(future.result(), use_container_width=True)  # Responsive width
+
+                        # Reports are built in the background and offered once ready
+                        report_downloads(chat_hash, selected_user, results)
 
 if __name__ == "__main__":
     st.set_page_config(layout="wide")
@@ -0,0 +1,44 @@
+"""Benchmarks for emoji_extractor.py.
+
+Run from the repository root:
+
+    python benchmarks/bench_emojis.py [number_of_messages]
+"""
+import os
+import random
+import sys
+from collections import Counter
+
+import emoji
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import emoji_extractor  # noqa: E402
+from bench_preprocess import timed  # noqa: E402
+
+WORDS = 'hello ok haha kal milte hai 😂 😂😂 👍 👍🏽 ❤️ 🇮🇳 👨‍👩‍👧 1️⃣ 🙏🏻'.split()
+
+
+def generate_messages(num_messages, seed=0):
+    """Build emoji-heavy messages: about half the words are emoji, many of them multi-code-point."""
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12))) for _ in range(num_messages)]
+
+
+def legacy_emojis(messages):
+    """helper.emojis as it was before emoji_extractor: one EMOJI_DATA lookup per character."""
+    return Counter(c for message in messages for c in message if c in emoji.EMOJI_DATA)
+
+
+def bench_emojis(messages):
+    legacy_time, _ = timed(legacy_emojis, messages)
+    new_time, result = timed(emoji_extractor.count_emojis, messages)
+    expected = Counter(match['emoji'] for message in messages[:10000] for match in emoji.emoji_list(message))
+    assert emoji_extractor.count_emojis(messages[:10000]).to_dict() == dict(expected)
+    print(f"emojis: legacy {legacy_time:7.3f}s  extractor {new_time:7.3f}s  ({legacy_time / new_time:.1f}x)")
+    print(f"distinct emoji: legacy {len(legacy_emojis(messages))} code points, extractor {len(result)} emoji")
+
+
+if __name__ == '__main__':
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f"{num_messages} messages")
+    bench_emojis(generate_messages(num_messages))
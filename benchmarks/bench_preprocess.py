@@ -0,0 +1,77 @@
+"""Benchmarks for preprocessor.py.
+
+Run from the repository root:
+
+    python benchmarks/bench_preprocess.py [number_of_messages]
+"""
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import preprocessor  # noqa: E402
+
+USERS = ['Aarav', 'Bhavna', 'Chetan Kumar', '+91 98765 43210']
+WORDS = 'hello ok haha yes no kal milte hai bro 😂 👍 https://example.com see you at 10:30'.split()
+
+
+def generate_chat(num_messages, seed=0):
+    """Build a synthetic 12-hour Android export with num_messages messages."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_messages):
+        stamp = datetime(2019, 1, 1) + timedelta(minutes=7 * i + rng.randint(0, 6))
+        header = stamp.strftime('%d/%m/%y, ') + f"{stamp.hour % 12 or 12}:{stamp.minute:02d} {'pm' if stamp.hour >= 12 else 'am'} - "
+        body = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+        lines.append(f"{header}{rng.choice(USERS)}: {body}\n")
+    return ''.join(lines)
+
+
+def legacy_dates(data):
+    """Timestamp handling as it was before parse_dates: strptime/strftime per row, then to_datetime."""
+    dates = re.findall(r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s?[APMapm]{2}\s-\s', data)
+    new_dates = []
+    for date_str in dates:
+        date_str = date_str.strip(' -')
+        in_time = datetime.strptime(date_str, "%d/%m/%y, %I:%M %p")
+        new_dates.append(in_time.strftime("%d/%m/%Y, %H:%M:%S"))
+    return pd.to_datetime(pd.Series(new_dates), format='%d/%m/%Y, %H:%M:%S')
+
+
+def vectorized_dates(data):
+    header = preprocessor.FORMATS['android_12h']
+    fields = ('day', 'month', 'year', 'hour', 'minute', 'second', 'am_pm')
+    headers = [match.group(*fields) for match in map(header.match, data.splitlines()) if match]
+    return preprocessor.parse_dates(headers)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_dates(data):
+    # Both sides include the header scan so the comparison is like for like
+    legacy_time, expected = timed(legacy_dates, data)
+    new_time, result = timed(vectorized_dates, data)
+    assert (expected.to_numpy() == result.to_numpy()).all()
+    print(f"timestamps:  legacy {legacy_time:7.3f}s  vectorized {new_time:7.3f}s  ({legacy_time / new_time:.1f}x)")
+
+
+def bench_memory(data):
+    report = preprocessor.memory_report(preprocessor.preprocess(data))
+    print(report.to_string(index=False))
+
+
+if __name__ == '__main__':
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    data = generate_chat(num_messages)
+    print(f"{num_messages} messages, {len(data) / 1e6:.1f} MB")
+    bench_dates(data)
+    bench_memory(data)
@@ -0,0 +1,73 @@
+"""Benchmarks for the word counting behind most_common_words and create_wordcloud.
+
+Run from the repository root:
+
+    python benchmarks/bench_words.py [number_of_messages]
+"""
+import os
+import sys
+from collections import Counter
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wordcloud import STOPWORDS, WordCloud  # noqa: E402
+import helper  # noqa: E402
+import preprocessor  # noqa: E402
+import tokenizer  # noqa: E402
+from bench_preprocess import generate_chat, timed  # noqa: E402
+
+STOP_WORDS = ['hai', 'ok', 'yes', 'no', 'the', 'at', 'to', 'ka', 'ki', 'ke', 'se', 'me', 'bhi', 'toh', 'na']
+
+
+def legacy_common_words(messages, stop_words):
+    """most_common_words as it was before tokenizer: one replace per punctuation character, list stopwords."""
+    for letter in tokenizer.PUNCTUATION:
+        messages = messages.str.replace(letter, "", regex=False)
+    words = [word for message in messages for word in message.lower().split() if word not in stop_words and word.isalpha()]
+    return pd.DataFrame(Counter(words).most_common(20), columns=['Word', 'Count'])
+
+
+def common_words(messages, stop_words):
+    counts = tokenizer.count_words(messages, frozenset(stop_words)).head(20)
+    return pd.DataFrame({'Word': counts.index, 'Count': counts.to_numpy()})
+
+
+def legacy_wordcloud(df, stop_words):
+    """create_wordcloud as it was before tokenizer: a per-row apply, then WordCloud.generate on the joined text."""
+    def remove_stop_words(message):
+        return " ".join([word for word in message.lower().split() if word not in stop_words and word.isalpha()])
+    temp = df[df['user'] != 'group_notification']
+    temp = temp[temp['message'] != '<Media omitted>\n']
+    wc = WordCloud(**dict(helper.WORDCLOUD_SETTINGS))
+    return wc.generate(temp['message'].apply(remove_stop_words).str.cat(sep=" "))
+
+
+def wordcloud(df, stop_words):
+    # What helper.create_wordcloud does: top-N counts, laid out with generate_from_frequencies
+    temp = df[df['user'] != 'group_notification']
+    temp = temp[temp['message'] != '<Media omitted>\n']
+    frequencies = tokenizer.count_words(temp['message'], frozenset(stop_words) | STOPWORDS, strip_punctuation=False)
+    return helper.render_wordcloud(frequencies.head(dict(helper.WORDCLOUD_SETTINGS)['max_words']).to_dict())
+
+
+def bench_common_words(messages):
+    legacy_time, expected = timed(legacy_common_words, messages, STOP_WORDS)
+    new_time, result = timed(common_words, messages, STOP_WORDS)
+    pd.testing.assert_frame_equal(expected, result, check_dtype=False)
+    print(f"common words: legacy {legacy_time:7.3f}s  tokenizer {new_time:7.3f}s  ({legacy_time / new_time:.1f}x)")
+
+
+def bench_wordcloud(df):
+    legacy_time, _ = timed(legacy_wordcloud, df, STOP_WORDS)
+    new_time, result = timed(wordcloud, df, STOP_WORDS)
+    assert result.words_
+    print(f"word cloud:   legacy {legacy_time:7.3f}s  frequencies {new_time:7.3f}s  ({legacy_time / new_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    df = preprocessor.preprocess(generate_chat(num_messages))
+    print(f"{num_messages} messages")
+    bench_common_words(df['message'])
+    bench_wordcloud(df)
@@ -0,0 +1,208 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import aggregates
+import preprocessor
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the store is disabled without pyarrow
+    feather = None
+
+# Where parsed chats are kept and how much disk they may use; the least recently used go first
+STORE_DIR = os.environ.get('CHAT_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.chat_store'))
+MAX_STORE_BYTES = int(float(os.environ.get('CHAT_STORE_MAX_MB', '2048')) * 1024 * 1024)
+
+# Number of leading bytes hashed to find earlier exports of the same chat cheaply
+HEAD_SIZE = 4096
+
+
+def enabled():
+    return feather is not None and MAX_STORE_BYTES > 0
+
+
+def content_hash(data):
+    """SHA-256 of a bytes-like object, the key chats are stored under."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def paths(chat_hash):
+    """Return the (frame, metadata, aggregates) files of a stored chat."""
+    return tuple(os.path.join(STORE_DIR, chat_hash + suffix) for suffix in ('.feather', '.json', '.aggregates.pkl'))
+
+
+def read_meta(chat_hash):
+    try:
+        with open(paths(chat_hash)[1]) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load(chat_hash, options):
+    """Return the stored chat for chat_hash if it was parsed with the same options, else None.
+
+    The Feather file is memory-mapped rather than read into a buffer first.
+    """
+    if not enabled():
+        return None
+    meta = read_meta(chat_hash)
+    if meta is None or meta['options'] != options:
+        return None
+    data_path = paths(chat_hash)[0]
+    try:
+        df = feather.read_table(data_path, memory_map=True).to_pandas()
+    except OSError:
+        return None
+    # Mark as recently used for pruning
+    os.utime(data_path)
+    df.attrs['compact'] = options.get('compact', False)
+    df.attrs['export_format'] = meta['export_format']
+    return df
+
+
+def save(chat_hash, df, data, options):
+    """Store a parsed chat together with what is needed to recognise later exports of it."""
+    if not enabled():
+        return
+    os.makedirs(STORE_DIR, exist_ok=True)
+    data_path, meta_path, _ = paths(chat_hash)
+    meta = {
+        'size': len(data),
+        'head': content_hash(data[:HEAD_SIZE]),
+        'export_format': df.attrs.get('export_format'),
+        'options': options,
+    }
+    # Write to temporary files first so readers never see half-written entries
+    feather.write_feather(df, data_path + '.tmp', compression='uncompressed')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(data_path + '.tmp', data_path)
+    os.replace(meta_path + '.tmp', meta_path)
+    prune()
+
+
+def find_prefix(data, options):
+    """Return (chat_hash, meta) of the largest stored export that data starts with, or None."""
+    head = content_hash(data[:HEAD_SIZE])
+    candidates = []
+    for name in os.listdir(STORE_DIR) if os.path.isdir(STORE_DIR) else []:
+        if not name.endswith('.json'):
+            continue
+        chat_hash = name[:-len('.json')]
+        meta = read_meta(chat_hash)
+        if meta and meta['head'] == head and meta['size'] < len(data) and meta['options'] == options:
+            candidates.append((meta['size'], chat_hash, meta))
+    for size, chat_hash, meta in sorted(candidates, key=lambda candidate: candidate[0], reverse=True):
+        if content_hash(data[:size]) == chat_hash:
+            return chat_hash, meta
+    return None
+
+
+def load_aggregates(chat_hash):
+    """Return the stored aggregates.build result for a chat, or None."""
+    if not enabled():
+        return None
+    try:
+        with open(paths(chat_hash)[2], 'rb') as f:
+            version, chat_aggregates = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    # Aggregates stored by an older version are rebuilt
+    if version != aggregates.VERSION:
+        return None
+    return chat_aggregates
+
+
+def save_aggregates(chat_hash, chat_aggregates):
+    if not enabled() or not os.path.exists(paths(chat_hash)[0]):
+        return
+    path = paths(chat_hash)[2]
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump((aggregates.VERSION, chat_aggregates), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def load_or_build_aggregates(chat_hash, df):
+    """Return the aggregates of a chat, building and storing them if they are not stored yet."""
+    chat_aggregates = load_aggregates(chat_hash)
+    if chat_aggregates is None:
+        chat_aggregates = aggregates.build(df)
+        save_aggregates(chat_hash, chat_aggregates)
+    return chat_aggregates
+
+
+def prune():
+    """Delete the least recently used chats until the store fits in MAX_STORE_BYTES."""
+    entries = []
+    for name in os.listdir(STORE_DIR):
+        if name.endswith('.feather'):
+            chat_hash = name[:-len('.feather')]
+            stat = os.stat(os.path.join(STORE_DIR, name))
+            size = sum(os.path.getsize(path) for path in paths(chat_hash) if os.path.exists(path))
+            entries.append((stat.st_mtime, size, chat_hash))
+    total = sum(size for _, size, _ in entries)
+    for _, size, chat_hash in sorted(entries):
+        if total <= MAX_STORE_BYTES:
+            break
+        for path in paths(chat_hash):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+
+def load_or_parse(upload, chat_hash, **options):
+    """Return the parsed chat for a binary upload (e.g. a Streamlit UploadedFile).
+
+    An export seen before is loaded from the store. An export that extends a stored one
+    only has its new tail parsed, and the stored aggregates are brought up to date from
+    the tail alone. Anything else is parsed in full. options are passed to
+    preprocessor.preprocess; the result is stored for next time.
+    """
+    df = load(chat_hash, options)
+    if df is not None:
+        return df
+
+    chat_aggregates = None
+    with upload.getbuffer() as data:
+        if enabled():
+            prefix = find_prefix(data, options)
+            if prefix is not None:
+                df, chat_aggregates = extend(prefix, data, options)
+        if df is None:
+            upload.seek(0)
+            df = preprocessor.preprocess(upload, **options)
+        save(chat_hash, df, data, options)
+    if chat_aggregates is not None:
+        save_aggregates(chat_hash, chat_aggregates)
+    return df
+
+
+def extend(prefix, data, options):
+    """Parse only what data adds after a stored export and append it.
+
+    Returns the combined frame and, when the stored export had aggregates, the combined
+    aggregates; (None, None) if the tail cannot be parsed on its own.
+    """
+    old_hash, meta = prefix
+    header = preprocessor.FORMATS.get(meta['export_format'])
+    tail = io.BytesIO(data[meta['size']:])
+    # The tail must start with a new message; otherwise it continues the last stored one
+    if header is None or not header.match(tail.readline().decode('utf-8', errors='replace')):
+        return None, None
+    old = load(old_hash, options)
+    if old is None:
+        return None, None
+    tail.seek(0)
+    new = preprocessor.preprocess(tail, export_format=meta['export_format'], **options)
+
+    chat_aggregates = load_aggregates(old_hash)
+    if chat_aggregates is not None:
+        chat_aggregates = aggregates.merge(chat_aggregates, aggregates.build(new))
+    df = preprocessor.concat_chunks([old, new])
+    df.attrs.update(old.attrs)
+    return df, chat_aggregates
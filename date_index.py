@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+
+def timestamp(value):
+    """A date, datetime or string as int64 nanoseconds, comparable with the index's times."""
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+class DateIndex:
+    """Message timestamps of a chat, sorted once, for counting messages in any date range by binary search.
+
+    Times are sorted per user, in one array with a block per user, so the position of a
+    timestamp in a user's block is that user's running message count up to it; a range
+    count is the difference of two searchsorted positions, O(log n) per user instead of
+    a scan of the chat.
+    """
+
+    def __init__(self, df):
+        times = df['date'].to_numpy(dtype='datetime64[ns]').view('int64')
+        codes, users = pd.factorize(df['user'])
+        order = np.lexsort((times, codes))
+        self.users = pd.Index(np.asarray(users, dtype=object), name='user')
+        self.times = times[order]
+        # Start of each user's block in self.times, plus the end of the last one
+        self.bounds = np.searchsorted(codes[order], np.arange(len(users) + 1))
+        self.sorted_times = np.sort(times)
+
+    def __len__(self):
+        return len(self.sorted_times)
+
+    def first(self):
+        return pd.Timestamp(self.sorted_times[0]) if len(self) else None
+
+    def last(self):
+        return pd.Timestamp(self.sorted_times[-1]) if len(self) else None
+
+    def span(self, start=None, end=None):
+        # start and end as int64 bounds of the half-open range [start, end)
+        low = np.iinfo(np.int64).min if start is None else timestamp(start)
+        high = np.iinfo(np.int64).max if end is None else timestamp(end)
+        return low, high
+
+    def count(self, start=None, end=None):
+        """Number of messages sent from start up to, but not including, end."""
+        low, high = self.span(start, end)
+        return int(np.searchsorted(self.sorted_times, high) - np.searchsorted(self.sorted_times, low))
+
+    def user_counts(self, start=None, end=None):
+        """Messages per user from start up to, but not including, end, most active first.
+
+        Users without messages in the range are left out, as value_counts on the filtered chat would.
+        """
+        low, high = self.span(start, end)
+        counts = np.array([np.searchsorted(block, high) - np.searchsorted(block, low)
+                           for block in (self.times[begin:stop] for begin, stop in zip(self.bounds[:-1], self.bounds[1:]))],
+                          dtype='int64')
+        counts = pd.Series(counts, index=self.users, name='count')
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
@@ -0,0 +1,106 @@
+from collections import Counter
+import emoji
+import numpy as np
+import pandas as pd
+
+# Code points that can start a keycap sequence (e.g. 1️⃣) but are plain text on their own
+KEYCAP_BASES = [ord(c) for c in '#*0123456789']
+KEYCAP_MARKS = [0xFE0F, 0x20E3]
+
+
+def build_trie(sequences):
+    """Nested dicts keyed by code point; '' marks the end of a complete emoji."""
+    root = {}
+    for sequence in sequences:
+        node = root
+        for character in sequence:
+            node = node.setdefault(character, {})
+        node[''] = {}
+    return root
+
+
+EMOJI_TRIE = build_trie(emoji.EMOJI_DATA)
+
+# Lookup tables indexed by code point. EMOJI_CHARS marks the non-ASCII code points that occur
+# in any emoji, including joiners, variation selectors, skin tones, regional indicators and tags
+_code_points = {ord(c) for sequence in emoji.EMOJI_DATA for c in sequence if not c.isascii()}
+EMOJI_CHARS = np.zeros(0x110000, dtype=bool)
+EMOJI_CHARS[list(_code_points)] = True
+SINGLE_EMOJI = np.zeros(len(EMOJI_CHARS), dtype=bool)
+SINGLE_EMOJI[[ord(sequence) for sequence in emoji.EMOJI_DATA if len(sequence) == 1]] = True
+IS_KEYCAP_BASE = np.zeros(len(EMOJI_CHARS), dtype=bool)
+IS_KEYCAP_BASE[KEYCAP_BASES] = True
+IS_KEYCAP_MARK = np.zeros(len(EMOJI_CHARS), dtype=bool)
+IS_KEYCAP_MARK[KEYCAP_MARKS] = True
+
+
+def split_run(run):
+    """Split a run of emoji code points into whole emoji, longest match first; leftovers are dropped."""
+    start = 0
+    while start < len(run):
+        node, end = EMOJI_TRIE, 0
+        for position in range(start, len(run)):
+            node = node.get(run[position])
+            if node is None:
+                break
+            if '' in node:
+                end = position + 1
+        if end:
+            yield run[start:end]
+            start = end
+        else:
+            start += 1
+
+
+def emoji_runs(text):
+    """Return the code points of text and the start and end offsets of its maximal runs of emoji code points."""
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    positions = np.flatnonzero(EMOJI_CHARS[codes])
+    first = np.ones(len(positions), dtype=bool)
+    first[1:] = np.diff(positions) != 1
+    last = np.ones(len(positions), dtype=bool)
+    last[:-1] = first[1:]
+    starts, ends = positions[first], positions[last] + 1
+    # Pull the ASCII base of keycap sequences into their run
+    keycap = (starts > 0) & IS_KEYCAP_MARK[codes[starts]] & IS_KEYCAP_BASE[codes[starts - 1]]
+    starts[keycap] -= 1
+    return codes, starts, ends
+
+
+def distinct_runs(codes, starts, lengths):
+    """Yield each distinct run of code points with its number of occurrences, one run length at a time."""
+    # Lone code points are counted without sorting
+    singles = np.bincount(codes[starts[lengths == 1]], minlength=len(EMOJI_CHARS))
+    for code in np.flatnonzero(singles).tolist():
+        yield chr(code), int(singles[code])
+    for length in np.unique(lengths[lengths > 1]).tolist():
+        rows = codes[starts[lengths == length][:, None] + np.arange(length)]
+        if length <= 3:
+            # Code points fit in 21 bits, so short runs pack into one integer that sorts fast
+            keys = (rows.astype(np.int64) << (21 * np.arange(length))).sum(axis=1)
+            values, occurrences = np.unique(keys, return_counts=True)
+            for value, count in zip(values.tolist(), occurrences.tolist()):
+                yield ''.join(chr((value >> (21 * i)) & 0x1FFFFF) for i in range(length)), count
+            continue
+        values, occurrences = np.unique(rows.view(np.dtype((np.void, 4 * length))).ravel(), return_counts=True)
+        for value, count in zip(values, occurrences.tolist()):
+            yield bytes(value).decode('utf-32-le'), count
+
+
+def count_emojis(messages):
+    """Count whole emoji (ZWJ sequences, skin tones, flags and keycaps as one) over a column of messages.
+
+    Code points are classified with one table lookup over the column and runs are counted
+    with numpy; only the distinct multi-code-point runs are split in Python.
+    Returns the counts most common first.
+    """
+    codes, starts, ends = emoji_runs('\n'.join(messages))
+    counts = Counter()
+    for run, occurrences in distinct_runs(codes, starts, ends - starts):
+        if len(run) == 1:
+            if SINGLE_EMOJI[ord(run)]:
+                counts[run] += occurrences
+            continue
+        for sequence in split_run(run):
+            counts[sequence] += occurrences
+    return pd.Series(counts, dtype='int64').sort_index().sort_values(ascending=False, kind='stable')
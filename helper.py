@@ -1,15 +1,46 @@
-from urlextract import URLExtract
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from collections import Counter
-import emoji
-from wordcloud import WordCloud
-from textblob import TextBlob
-
-extract = URLExtract()
-
-def create_wordcloud(selected_user, df):
-    with open('hinglish.txt', 'r') as f:
-        stop_words = f.read().splitlines()
+from wordcloud import WordCloud, STOPWORDS
+import preprocessor
+import tokenizer
+import resources
+import emoji_extractor
+import links
+import sentiment
+import sessions
+import activity
+import timelines
+import workers
+import aggregates as chat_aggregates
+
+def value_counts(column):
+    # Categorical columns also report categories that do not occur in the (filtered) frame
+    counts = column.value_counts()
+    return counts[counts > 0]
+
+# WordCloud options, as (name, value) pairs so they can be part of a cache key; max_words caps the words laid out
+WORDCLOUD_SETTINGS = (('width', 500), ('height', 500), ('min_font_size', 10), ('background_color', 'white'),
+                      ('max_words', 200))
+
+# Rendered word clouds by (chat hash, user, settings); the least recently used go first
+MAX_CACHED_WORDCLOUDS = 64
+_wordclouds = OrderedDict()
+_wordclouds_lock = threading.Lock()
+
+def word_frequencies(selected_user, df, aggregates=None, top=None, cloud=False):
+    """Count the words of a user's messages without stopwords, most common first, keeping the top ones.
+
+    With cloud, words are counted the way the word cloud always has: tokens with punctuation
+    (links, "don't") are dropped rather than stripped, and WordCloud's English stopwords go too.
+    """
+    stop_words = resources.stop_words() | STOPWORDS if cloud else resources.stop_words()
+
+    if aggregates is not None:
+        counts = chat_aggregates.for_user(aggregates['cloud_words' if cloud else 'words'], selected_user)
+        counts = counts[~counts.index.isin(stop_words)].sort_values(['count', 'first'], ascending=[False, True])
+        return counts['count'].head(top)
 
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
@@ -17,97 +48,180 @@ def create_wordcloud(selected_user, df):
     temp = df[df['user'] != 'group_notification']
     temp = temp[temp['message'] != '<Media omitted>\n']
 
-    def remove_stop_words(message):
-        return " ".join([word for word in message.lower().split() if word not in stop_words and word.isalpha()])
-
-    wc = WordCloud(width=500, height=500, min_font_size=10, background_color='white')
-    temp['message'] = temp['message'].apply(remove_stop_words)
-    df_wc = wc.generate(temp['message'].str.cat(sep=" "))
-    return df_wc
+    return tokenizer.count_words(temp['message'], stop_words, strip_punctuation=not cloud).head(top)
+
+def render_wordcloud(frequencies, settings=WORDCLOUD_SETTINGS):
+    # Lays out only the given words, so the cost does not grow with the chat's vocabulary
+    return WordCloud(**dict(settings)).generate_from_frequencies(frequencies)
+
+def create_wordcloud(selected_user, df, aggregates=None, settings=WORDCLOUD_SETTINGS):
+    frequencies = word_frequencies(selected_user, df, aggregates, dict(settings)['max_words'], cloud=True)
+    return render_wordcloud(frequencies.to_dict(), settings)
+
+def wordcloud_array(frequencies, settings):
+    # The rendered RGB array, which pickles, so the layout can run in a worker process
+    return render_wordcloud(frequencies, settings).to_array()
+
+def figure_png(fig):
+    # PNG bytes of a plotly figure, rendered in memory; a module function so each worker process exports with its own kaleido
+    return fig.to_image(format='png')
+
+def wordcloud_image(selected_user, df, aggregates=None, chat_hash=None, settings=WORDCLOUD_SETTINGS):
+    """The word cloud as an RGB array, laid out once per (chat hash, user, settings)."""
+    key = (chat_hash, selected_user, settings)
+    with _wordclouds_lock:
+        if chat_hash is not None and key in _wordclouds:
+            _wordclouds.move_to_end(key)
+            return _wordclouds[key]
+
+    frequencies = word_frequencies(selected_user, df, aggregates, dict(settings)['max_words'], cloud=True).to_dict()
+    pool = workers.process_pool()
+    if pool is None:
+        image = wordcloud_array(frequencies, settings)
+    else:
+        image = pool.submit(wordcloud_array, frequencies, settings).result()
+
+    if chat_hash is not None:
+        with _wordclouds_lock:
+            _wordclouds[key] = image
+            while len(_wordclouds) > MAX_CACHED_WORDCLOUDS:
+                _wordclouds.popitem(last=False)
+    return image
 
 def sentiment_analysis(df):
-    df['sentiment'] = df['message'].apply(lambda msg: TextBlob(msg).sentiment.polarity)
-    df['sentiment_label'] = df['sentiment'].apply(lambda score: 'Positive' if score > 0 else 'Negative' if score < 0 else 'Neutral')
+    df['sentiment'] = sentiment.polarity(df['message'])
+    df['sentiment_label'] = sentiment.labels(df['sentiment'])
     sentiment_counts = df['sentiment_label'].value_counts()
     return sentiment_counts, df
 
-def fetch_stats(selected_user, df):
+def fetch_stats(selected_user, df, aggregates=None):
+    if aggregates is not None:
+        stats = chat_aggregates.for_user(aggregates['totals'], selected_user)
+        return tuple(int(stats.get(stat, 0)) for stat in ('messages', 'words', 'media', 'links'))
+
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
 
     num_messages = df.shape[0]
     words = [word for message in df['message'] for word in message.split()]
     num_media_messages = df[df['message'] == '<Media omitted>\n'].shape[0]
-    links = [link for message in df['message'] for link in extract.find_urls(message)]
+    num_links = len(links.find_links(df['message']))
 
-    return num_messages, len(words), num_media_messages, len(links)
+    return num_messages, len(words), num_media_messages, num_links
+
+def link_domains(selected_user, df, aggregates=None):
+    if aggregates is not None:
+        counts = chat_aggregates.for_user(aggregates['domains'], selected_user).sort_values(ascending=False, kind='stable')
+        return pd.DataFrame({'Domain': counts.index, 'Count': counts.to_numpy()})
 
-def monthly_timeline(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
+    counts = links.domain_counts(links.find_links(df['message']))
+    return pd.DataFrame({'Domain': counts.index, 'Count': counts.to_numpy()})
 
-    timeline = df.groupby(['year', 'month_num', 'month']).count()['message'].reset_index()
-    timeline['time'] = timeline.apply(lambda row: f"{row['month']}-{row['year']}", axis=1)
-    return timeline
-
-def daily_timeline(selected_user, df):
+def date_counts(selected_user, df, aggregates=None):
+    """Count a user's messages per calendar day, sorted by day."""
+    if aggregates is not None:
+        return chat_aggregates.for_user(aggregates['daily'], selected_user)
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
+    return timelines.daily_counts(df['date'])
+
+def monthly_timeline(selected_user, df, aggregates=None, start=None, end=None):
+    counts = date_counts(selected_user, df, aggregates)
+    _, counts = timelines.resample(counts, start, end, 'month')
+    timeline = pd.DataFrame({'year': counts.index.year, 'month_num': counts.index.month,
+                             'month': pd.Index(preprocessor.MONTHS)[counts.index.month - 1],
+                             'message': counts.to_numpy()})
+    timeline['time'] = timeline['month'] + '-' + timeline['year'].astype(str)
+    return timeline
 
-    daily_timeline = df.groupby('only_date').count()['message'].reset_index()
+def daily_timeline(selected_user, df, aggregates=None, start=None, end=None):
+    """Messages per day, or per week, month or quarter when the range has too many days for one chart.
+
+    only_date is the first day of each bucket, and attrs['granularity'] names the bucket size.
+    """
+    counts = date_counts(selected_user, df, aggregates)
+    granularity, counts = timelines.resample(counts, start, end)
+    daily_timeline = pd.DataFrame({'only_date': counts.index, 'message': counts.to_numpy()})
+    daily_timeline.attrs['granularity'] = granularity
     return daily_timeline
 
-def week_activity_map(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-    return df['day_name'].value_counts()
+def activity_cube(selected_user, df, aggregates=None):
+    """A user's messages per (month, weekday, 15-minute slot), see activity.py."""
+    if aggregates is not None:
+        cubes = aggregates['activity']
+        if selected_user not in cubes.index:
+            return np.zeros(activity.SHAPE, dtype='int64')
+        return cubes.loc[selected_user].to_numpy().reshape(activity.SHAPE)
 
-def month_activity_map(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
-    return df['month'].value_counts()
+    return activity.cube(df['date'])
 
-def activity_heatmap(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-    user_heatmap = df.pivot_table(index='day_name', columns='period', values='message', aggfunc='count').fillna(0)
-    return user_heatmap
-
-def most_busy_users(df):
-    x = df['user'].value_counts().head(15)
-    df = round((df['user'].value_counts() / df.shape[0]) * 100, 2).reset_index().rename(
-        columns={'index': 'Name', 'user': 'Percentage'})
-    return x, df
+def week_activity_map(selected_user, df, aggregates=None):
+    return activity.weekdays(activity_cube(selected_user, df, aggregates))
 
-def most_common_words(selected_user, df):
-    with open('hinglish.txt', 'r') as f:
-        stop_words = f.read().splitlines()
+def month_activity_map(selected_user, df, aggregates=None):
+    return activity.months(activity_cube(selected_user, df, aggregates))
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+def activity_heatmap(selected_user, df, aggregates=None, minutes=60):
+    """Messages per weekday and hour, or per 30 or 15 minutes, always as the full 7-row grid."""
+    return activity.heatmap(activity_cube(selected_user, df, aggregates), minutes)
 
-    temp = df[df['user'] != 'group_notification']
-    temp = temp[temp['message'] != '<Media omitted>\n']
+def user_message_counts(df, aggregates=None):
+    if aggregates is not None:
+        return aggregates['users'].sort_values(ascending=False, kind='stable').rename('count')
+    return value_counts(df['user'])
 
-    punc = '''!()-[]{};:'"\,<>./?@#$%^&*_~'''
-    for letter in punc:
-        temp['message'] = temp['message'].str.replace(letter, "", regex=False)
+def most_busy_users(df, aggregates=None):
+    counts = user_message_counts(df, aggregates)
+    x = counts.head(15)
+    df = round((counts / counts.sum()) * 100, 2).reset_index().rename(
+        columns={'index': 'Name', 'user': 'Percentage'})
+    return x, df
 
-    words = [word for message in temp['message'] for word in message.lower().split() if word not in stop_words and word.isalpha()]
+def most_common_words(selected_user, df, aggregates=None):
+    counts = word_frequencies(selected_user, df, aggregates, 20)
+    return pd.DataFrame({'Word': counts.index, 'Count': counts.to_numpy()})
 
-    most_common_df = pd.DataFrame(Counter(words).most_common(20), columns=['Word', 'Count'])
-    return most_common_df
+def emojis(selected_user, df, aggregates=None):
+    if aggregates is not None:
+        counts = chat_aggregates.for_user(aggregates['emojis'], selected_user).sort_values(ascending=False, kind='stable')
+        return pd.DataFrame({'Emoji': counts.index, 'Count': counts.to_numpy()})
 
-def emojis(selected_user, df):
     if selected_user != 'Overall':
         df = df[df['user'] == selected_user]
-    emojis = [c for message in df['message'] for c in message if c in emoji.EMOJI_DATA]
-    emoji_df = pd.DataFrame(Counter(emojis).most_common(len(Counter(emojis))), columns=['Emoji', 'Count'])
+    counts = emoji_extractor.count_emojis(df['message'])
+    emoji_df = pd.DataFrame({'Emoji': counts.index, 'Count': counts.to_numpy()})
     return emoji_df
 
-def most_active_users(df):
-    """Get the top 15 most active users and their percentage of total messages."""
-    top_users = df['user'].value_counts().head(15)
-    user_percentage = round((df['user'].value_counts() / df.shape[0]) * 100, 2).reset_index().rename(
+def user_shares(counts):
+    """The top 15 users and every user's percentage of the messages, from messages per user, most active first."""
+    top_users = counts.head(15)
+    user_percentage = round((counts / counts.sum()) * 100, 2).reset_index().rename(
         columns={'index': 'Name', 'user': 'Percentage'})
     return top_users, user_percentage
+
+def most_active_users(df, aggregates=None):
+    """Get the top 15 most active users and their percentage of total messages."""
+    return user_shares(user_message_counts(df, aggregates))
+
+def conversation_sessions(selected_user, df):
+    """Conversation sessions of the chat, or those the user wrote in."""
+    return sessions.sessions(df, user=None if selected_user == 'Overall' else selected_user)
+
+def user_replies(selected_user, df, replies=None):
+    # replies of the whole chat can be passed in when several views need them
+    replies = sessions.replies(df) if replies is None else replies
+    if selected_user != 'Overall':
+        replies = replies[replies['user'] == selected_user]
+    return replies
+
+def response_times(selected_user, df, replies=None):
+    """Replies per user with median and mean reply time in minutes, fastest first."""
+    return sessions.response_times(user_replies(selected_user, df, replies))
+
+def reply_pairs(selected_user, df, replies=None):
+    """How often each user (rows) replied to each other user (columns)."""
+    return sessions.reply_pairs(user_replies(selected_user, df, replies))
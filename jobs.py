@@ -0,0 +1,66 @@
+import threading
+import uuid
+from collections import OrderedDict
+import workers
+
+# Jobs kept for lookup by id; the oldest finished ones are forgotten first
+MAX_JOBS = 256
+
+# job id -> Job, and (key, name) -> job id so that a running or finished job is reused
+_jobs = OrderedDict()
+_ids = {}
+_lock = threading.Lock()
+
+
+class Job:
+    """One pipeline result, such as a report, built in the background on the shared worker pools."""
+
+    def __init__(self, results, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.results = results
+        self.future = results.submit(name, workers.thread_pool(), workers.process_pool())
+        # Only the artifact is kept once the job is over, not the pipeline with its chat and charts
+        self.future.add_done_callback(lambda _: setattr(self, 'results', None))
+
+    @property
+    def status(self):
+        """'running', 'done' or 'failed'."""
+        if not self.future.done():
+            return 'running'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    def progress(self):
+        results = self.results
+        return 1.0 if results is None or self.future.done() else results.progress(self.name)
+
+    def artifact(self):
+        """The finished result; blocks while the job is running and raises if it failed."""
+        return self.future.result()
+
+
+def start(key, results, name, retry=False):
+    """Return the job building results[name] for key (e.g. chat and user), starting one unless
+    there already is one; with retry, a failed job is replaced by a new one."""
+    with _lock:
+        job = _jobs.get(_ids.get((key, name)))
+        if job is None or (retry and job.status == 'failed'):
+            job = Job(results, name)
+            _jobs[job.id] = job
+            _ids[(key, name)] = job.id
+            forget_finished()
+        return job
+
+
+def get(job_id):
+    """The job with this id, or None if it is unknown or was forgotten."""
+    return _jobs.get(job_id)
+
+
+def forget_finished():
+    # Called with _lock held; running jobs are kept whatever the count
+    finished = [job_id for job_id, job in _jobs.items() if job.status != 'running']
+    for job_id in finished[:max(len(_jobs) - MAX_JOBS, 0)]:
+        del _jobs[job_id]
+    for job_key in [job_key for job_key, job_id in _ids.items() if job_id not in _jobs]:
+        del _ids[job_key]
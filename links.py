@@ -0,0 +1,52 @@
+from urllib.parse import urlsplit
+import pandas as pd
+from urlextract import URLExtract
+import workers
+
+# A link needs a dot followed by a TLD or an IP address octet, or a scheme (e.g. http://localhost)
+CANDIDATE_PATTERN = r'\.\w|://'
+
+_extract = None
+
+
+def extractor():
+    # Created on first use, once per process, since loading the TLD list is not free
+    global _extract
+    if _extract is None:
+        _extract = URLExtract()
+    return _extract
+
+
+def find_urls(messages):
+    return [extractor().find_urls(message) for message in messages]
+
+
+def candidates(messages):
+    """Mark the messages that can contain a link, so URLExtract only sees those."""
+    return messages.str.contains(CANDIDATE_PATTERN)
+
+
+def find_links(messages):
+    """Return every link in a column of messages as a Series indexed like the message it came from.
+
+    Only candidate messages go through URLExtract, spread over a process pool when there
+    are enough of them.
+    """
+    messages = messages[candidates(messages)]
+    found = workers.map_batches(find_urls, messages)
+    return pd.Series(found, index=messages.index, dtype=object).explode().dropna().astype(object)
+
+
+def domain(url):
+    """Host of a link, lowercased and without 'www.', e.g. 'youtube.com'; links need not have a scheme."""
+    try:
+        host = urlsplit(url if '://' in url else '//' + url).hostname or ''
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def domain_counts(links):
+    """Count links per domain, most common first."""
+    counts = links.map(domain).value_counts().sort_index().sort_values(ascending=False, kind='stable')
+    return counts.rename_axis('domain').rename('count')
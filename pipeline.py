@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import Future
+
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class Pipeline:
+    """The results of one analysis run, each computed on first use and at most once.
+
+    metrics maps a name to (function, dependencies) or (function, dependencies, 'process'):
+    the function is called with the results of its dependencies, in order, which name
+    other metrics or the inputs given here. Views, charts and reports that ask for the
+    same name share one result. Metrics marked 'process' are pure-Python work that holds
+    the GIL; when submitted with a process pool they run there, so their function and
+    arguments must pickle.
+    """
+
+    def __init__(self, metrics, **inputs):
+        self.metrics = metrics
+        self._futures = {name: done(value) for name, value in inputs.items()}
+        self._lock = threading.Lock()
+        self.check(inputs)
+
+    def check(self, inputs):
+        """Raise ValueError for a dependency that does not exist or that depends on itself."""
+        finished = set(inputs)
+
+        def visit(name, path):
+            if name in finished:
+                return
+            if name in path:
+                raise ValueError(f"Metric {name!r} depends on itself")
+            if name not in self.metrics:
+                raise ValueError(f"Unknown metric {name!r}")
+            for dependency in self.metrics[name][1]:
+                visit(dependency, path + (name,))
+            finished.add(name)
+
+        for name in self.metrics:
+            visit(name, ())
+
+    def requirements(self, name):
+        """The metric and every metric it depends on, directly or not."""
+        names = {name}
+        for dependency in self.metrics[name][1]:
+            if dependency in self.metrics:
+                names |= self.requirements(dependency)
+        return names
+
+    def progress(self, name):
+        """Fraction of the work behind a metric that is done, from 0 to 1."""
+        names = self.requirements(name)
+        futures = [self._futures.get(required) for required in names]
+        finished = sum(1 for future in futures if future is not None and future.done())
+        return finished / len(names)
+
+    def __getitem__(self, name):
+        return self.submit(name).result()
+
+    def __contains__(self, name):
+        future = self._futures.get(name)
+        return future is not None and future.done() and future.exception() is None
+
+    def submit(self, name, threads=None, processes=None):
+        """Return a Future of a metric's result, scheduling it and whatever it depends on.
+
+        Without a thread pool the metric is computed in the calling thread. With one, it
+        runs there once its dependencies are done; every dependency is queued before its
+        dependents, so a waiting task never blocks the ones it waits for.
+        """
+        with self._lock:
+            future = self._futures.get(name)
+            if future is not None:
+                return future
+            future = self._futures[name] = Future()
+        # Kept here rather than looked up when running, since a failed dependency is dropped from _futures
+        dependencies = [self.submit(dependency, threads, processes) for dependency in self.metrics[name][1]]
+        if threads is None:
+            self.run(name, future, dependencies, processes)
+        else:
+            threads.submit(self.run, name, future, dependencies, processes)
+        return future
+
+    def run(self, name, future, dependencies, processes=None):
+        function, _, *kind = self.metrics[name]
+        try:
+            arguments = [dependency.result() for dependency in dependencies]
+            if processes is not None and kind == ['process']:
+                future.set_result(processes.submit(function, *arguments).result())
+            else:
+                future.set_result(function(*arguments))
+        except BaseException as error:
+            # Failures are not kept, so the next request for the metric tries again
+            with self._lock:
+                if self._futures.get(name) is future:
+                    del self._futures[name]
+            future.set_exception(error)
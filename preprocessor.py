@@ -1,63 +1,339 @@
+import io
+import itertools
 import re
+import numpy as np
 import pandas as pd
-from datetime import datetime
 
-def preprocess(data):
-    # Define the regex pattern to split messages and extract dates
-    pattern = r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s?[APMapm]{2}\s-\s'
+# Building blocks for message headers. Every format defines the named groups day, month,
+# year, hour and minute, and may define second and am_pm.
+DAY_FIRST = r'(?P<day>\d{1,2})[/.-](?P<month>\d{1,2})[/.-](?P<year>\d{2,4})'
+MONTH_FIRST = r'(?P<month>\d{1,2})[/.-](?P<day>\d{1,2})[/.-](?P<year>\d{2,4})'
+TIME_12H = r'(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?\s?(?P<am_pm>[APap]\.?\s?[Mm]\.?)'
+TIME_24H = r'(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?'
 
-    # Split messages and extract dates
-    messages = re.split(pattern, data)[1:]
-    dates = re.findall(pattern, data)
+# Header groups that make up the timestamp
+DATE_FIELDS = ('day', 'month', 'year', 'hour', 'minute', 'second', 'am_pm')
 
-    # Convert 12-hour format with AM/PM to 24-hour format
-    new_dates = []
-    for date_str in dates:
-        date_str = date_str.strip(' -')
-        in_time = datetime.strptime(date_str, "%d/%m/%y, %I:%M %p")
-        out_time = in_time.strftime("%d/%m/%Y, %H:%M:%S")
-        new_dates.append(out_time)
+# Author prefix of a message body, as used to tell user messages from notifications
+user_pattern = r'([\w\W]+?):\s'
 
-    # Check if the number of extracted dates matches the number of messages
-    if len(new_dates) != len(messages):
-        raise ValueError("The number of dates and messages extracted do not match. Please check the input data format.")
+# Registered export formats, name -> compiled header pattern, in order of preference
+FORMATS = {}
 
-    # Create DataFrame
-    df = pd.DataFrame({'user_message': messages, 'message_date': new_dates})
+# Number of characters read from the start of an export to detect its format
+SAMPLE_SIZE = 8192
 
-    # Convert message_date to datetime object
-    df['message_date'] = pd.to_datetime(df['message_date'], format='%d/%m/%Y, %H:%M:%S')
+# Number of messages turned into a DataFrame at a time
+CHUNK_SIZE = 100000
 
-    df.rename(columns={'message_date': 'date'}, inplace=True)
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+          'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PERIODS = [f"{hour:02d}-{(hour + 1) % 24:02d}" for hour in range(24)]
 
-    # Extract users and messages
+# dtypes of the compact schema; the remaining text columns become unordered categoricals
+COMPACT_DTYPES = {
+    'year': 'int16',
+    'month_num': 'int8',
+    'month': pd.CategoricalDtype(MONTHS, ordered=True),
+    'day': 'int8',
+    'day_name': pd.CategoricalDtype(DAY_NAMES, ordered=True),
+    'hour': 'int8',
+    'minute': 'int8',
+    'second': 'int8',
+    'period': pd.CategoricalDtype(PERIODS, ordered=True),
+}
+COMPACT_CATEGORIES = ['user', 'only_date']
+
+
+def register_format(name, header):
+    """Register an export format by the regex of the header that starts each of its messages.
+
+    The optional "name: " author prefix is appended here, so header should stop right before it.
+    """
+    FORMATS[name] = re.compile(header + r'(?:(?P<user>[\w\W]+?):\s)?')
+
+
+# Android: "21/03/23, 9:41 pm - Alice: hi"
+register_format('android_12h', DAY_FIRST + r',\s' + TIME_12H + r'\s-\s')
+register_format('android_24h', DAY_FIRST + r',\s' + TIME_24H + r'\s-\s')
+register_format('android_us_12h', MONTH_FIRST + r',\s' + TIME_12H + r'\s-\s')
+register_format('android_us_24h', MONTH_FIRST + r',\s' + TIME_24H + r'\s-\s')
+# iOS: "[21/03/2023, 21:41:07] Alice: hi", sometimes preceded by a left-to-right mark
+register_format('ios_12h', r'\u200e?\[' + DAY_FIRST + r',\s' + TIME_12H + r'\]\s')
+register_format('ios_24h', r'\u200e?\[' + DAY_FIRST + r',\s' + TIME_24H + r'\]\s')
+register_format('ios_us_12h', r'\u200e?\[' + MONTH_FIRST + r',\s' + TIME_12H + r'\]\s')
+register_format('ios_us_24h', r'\u200e?\[' + MONTH_FIRST + r',\s' + TIME_24H + r'\]\s')
+
+
+def date_fields(header):
+    """Return the DATE_FIELDS defined by a compiled header pattern, in DATE_FIELDS order."""
+    return [field for field in DATE_FIELDS if field in header.groupindex]
+
+
+def detect_format(sample):
+    """Return the name of the registered format that fits the most header lines of sample.
+
+    Day-first and month-first formats match the same lines, so only headers with a valid
+    day and month count; ties go to the format registered first.
+    """
+    lines = sample.splitlines()
+    best_name = None
+    best_count = 0
+    for name, header in FORMATS.items():
+        count = 0
+        for line in lines:
+            match = header.match(line)
+            if match and int(match.group('month')) <= 12 and int(match.group('day')) <= 31:
+                count += 1
+        if count > best_count:
+            best_name = name
+            best_count = count
+
+    if best_name is None:
+        raise ValueError("Could not recognise the chat export format. Please check the input data format.")
+    return best_name
+
+
+def open_lines(data):
+    """Return a line iterator over a chat export given as str, bytes or a (binary or text) file object."""
+    if isinstance(data, str):
+        return io.StringIO(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    if isinstance(data, io.TextIOBase):
+        return data
+    # newline='' keeps line endings exactly as they are in the export
+    return io.TextIOWrapper(data, encoding='utf-8', newline='')
+
+
+def iter_messages(lines, header):
+    """Yield (date fields, user, message) triples from one scan of the export.
+
+    header is a compiled pattern from FORMATS; the date fields are the DATE_FIELDS it
+    defines, in that order. The lines of multi-line messages are joined as they are read.
+    user is None when the header line has no "name: " prefix (group notifications).
+    """
+    fields = date_fields(header)
+    date = None
+    parts = []
+    for line in lines:
+        match = header.match(line)
+        if match:
+            if date is not None:
+                yield date, user, ''.join(parts)
+            date = match.group(*fields)
+            user = match.group('user')
+            parts = [line[match.end():]]
+        elif date is not None:
+            # Continuation of the previous message
+            parts.append(line)
+    if date is not None:
+        yield date, user, ''.join(parts)
+
+
+def iter_chunks(lines, header, chunk_size=CHUNK_SIZE, compact=False, lazy=False):
+    """Yield preprocessed DataFrames of at most chunk_size messages each."""
+    fields = date_fields(header)
+    dates = []
     users = []
     messages = []
-    for message in df['user_message']:
-        entry = re.split(r'([\w\W]+?):\s', message)
-        if len(entry) > 2:  # username is present
-            users.append(entry[1])
-            messages.append(" ".join(entry[2:]))
-        else:
-            users.append('group_notification')
-            messages.append(entry[0])
-
-    df['user'] = users
-    df['message'] = messages
-    df.drop(columns=['user_message'], inplace=True)
-
-    # Extract date components
-    df['only_date'] = df['date'].dt.strftime('%d/%m/%Y')
-    df['year'] = df['date'].dt.year
-    df['month_num'] = df['date'].dt.month
-    df['month'] = df['date'].dt.month_name()
-    df['day'] = df['date'].dt.day
-    df['day_name'] = df['date'].dt.day_name()
-    df['hour'] = df['date'].dt.hour
-    df['minute'] = df['date'].dt.minute
-    df['second'] = df['date'].dt.second
-
-    # Calculate periods
-    df['period'] = df['hour'].apply(lambda x: f"{x:02d}-{(x + 1) % 24:02d}")
+    for date, user, message in iter_messages(lines, header):
+        dates.append(date)
+        users.append(user)
+        messages.append(message)
+        if len(dates) >= chunk_size:
+            yield build_frame(dates, users, messages, fields, compact, lazy)
+            dates = []
+            users = []
+            messages = []
+    if dates:
+        yield build_frame(dates, users, messages, fields, compact, lazy)
+
+
+def parse_dates(dates, fields=DATE_FIELDS):
+    """Convert captured header fields to datetimes, converting all rows together with array operations.
+
+    fields names the DATE_FIELDS held by each row of dates; second and am_pm are optional
+    and may also be None on individual rows.
+    """
+    if not dates:
+        return pd.Series([], dtype='datetime64[ns]')
+
+    columns = dict(zip(fields, zip(*dates)))
+    year = np.array(columns['year'], dtype=np.int64)
+    year = np.where(year < 100, year + 2000, year)
+
+    hour = np.array(columns['hour'], dtype=np.int64)
+    if 'am_pm' in columns:
+        # Convert 12-hour format with AM/PM to 24-hour format
+        am_pm = pd.Series(columns['am_pm'], dtype=object)
+        pm = am_pm.str[0].isin(('p', 'P')).to_numpy()
+        hour = np.where(am_pm.notna().to_numpy(), hour % 12 + 12 * pm, hour)
+    seconds = (hour * 60 + np.array(columns['minute'], dtype=np.int64)) * 60
+    if 'second' in columns:
+        seconds += pd.to_numeric(pd.Series(columns['second'], dtype=object)).fillna(0).to_numpy(np.int64)
+
+    days = pd.to_datetime(pd.DataFrame({
+        'year': year,
+        'month': np.array(columns['month'], dtype=np.int64),
+        'day': np.array(columns['day'], dtype=np.int64),
+    }))
+    return days + pd.to_timedelta(seconds, unit='s')
+
+
+def build_frame(dates, users, messages, fields=DATE_FIELDS, compact=False, lazy=False):
+    """Build the analysis DataFrame from the fields collected by iter_messages.
+
+    With lazy=True only date, user and message are built; see derive for the other columns.
+    """
+    df = pd.DataFrame({
+        'date': parse_dates(dates, fields),
+        'user': pd.Series(users, dtype=object),
+        'message': pd.Series(messages, dtype=object),
+    })
+
+    # A notification spanning several lines may still have a "name: " prefix further down
+    missing = df['user'].isna()
+    if missing.any():
+        found = df.loc[missing, 'message'].str.extract('^' + user_pattern + r'([\w\W]*)$')
+        found = found.dropna()
+        df.loc[found.index, 'user'] = found[0]
+        df.loc[found.index, 'message'] = found[1]
+    # Later "text: " pieces become " text ", exactly as splitting on user_pattern always did.
+    # Only messages that contain ": " at all can change, so the regex skips all the others.
+    colons = df['user'].notna() & df['message'].str.contains(r':\s')
+    df.loc[colons, 'message'] = df.loc[colons, 'message'].str.replace(user_pattern, r' \1 ', regex=True)
+    df['user'] = df['user'].fillna('group_notification')
+
+    df.attrs['compact'] = compact
+    if not lazy:
+        derive(df, *DERIVED_COLUMNS)
+    if compact:
+        compact_frame(df)
+    return df
+
+
+def calendar_labels(codes, labels):
+    """Label integer codes (0 for labels[0], ...) as an ordered categorical."""
+    return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(labels, ordered=True))
+
+
+def date_labels(date):
+    """Format each message's day as dd/mm/yyyy, formatting every distinct day only once."""
+    codes, days = pd.factorize(date.dt.normalize(), sort=True)
+    return pd.Categorical.from_codes(codes, categories=days.strftime('%d/%m/%Y'))
+
+
+# Columns derived from 'date', in the order preprocess adds them, name -> function of the date column
+DERIVED_COLUMNS = {
+    'only_date': date_labels,
+    'year': lambda date: date.dt.year,
+    'month_num': lambda date: date.dt.month,
+    'month': lambda date: calendar_labels(date.dt.month - 1, MONTHS),
+    'day': lambda date: date.dt.day,
+    'day_name': lambda date: calendar_labels(date.dt.dayofweek, DAY_NAMES),
+    'hour': lambda date: date.dt.hour,
+    'minute': lambda date: date.dt.minute,
+    'second': lambda date: date.dt.second,
+    'period': lambda date: calendar_labels(date.dt.hour, PERIODS),
+}
+
+
+def derive(df, *columns):
+    """Add the requested DERIVED_COLUMNS to df unless it already has them, and return df.
+
+    Columns are stored on df, so each one is computed at most once per frame; derive on the
+    full chat before filtering it so the work is shared by every view. Frames built with
+    compact=True get compact dtypes.
+    """
+    compact = df.attrs.get('compact', False)
+    for column in columns:
+        if column in df:
+            continue
+        values = DERIVED_COLUMNS[column](df['date'])
+        if compact:
+            values = pd.Series(values, index=df.index).astype(COMPACT_DTYPES.get(column, 'category'))
+        elif isinstance(values, pd.Categorical):
+            values = values.astype(object)
+        df[column] = values
+    return df
+
+
+def compact_frame(df):
+    """Convert the columns of a preprocessed DataFrame to the compact schema, in place.
+
+    Low-cardinality text columns become categoricals (months, weekdays and periods in
+    calendar order) and date parts become small integers. Returns df.
+    """
+    df.attrs['compact'] = True
+    for column, dtype in COMPACT_DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    for column in COMPACT_CATEGORIES:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def concat_chunks(chunks):
+    """Concatenate preprocessed chunks, keeping categorical columns categorical.
+
+    pd.concat falls back to object dtype when chunks have different categories, so they are
+    widened to the union of all chunks' categories first.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    for column in COMPACT_CATEGORIES:
+        if column in chunks[0] and isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = chunks[0][column].cat.categories
+            for chunk in chunks[1:]:
+                categories = categories.union(chunk[column].cat.categories)
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def memory_report(df):
+    """Compare the memory used by each column of a default preprocessed DataFrame with the compact schema."""
+    compact = compact_frame(df.copy())
+    report = pd.DataFrame({
+        'Column': df.columns,
+        'Default (MB)': df.memory_usage(index=False, deep=True).to_numpy() / 1e6,
+        'Compact (MB)': compact.memory_usage(index=False, deep=True).to_numpy() / 1e6,
+    })
+    total = report[['Default (MB)', 'Compact (MB)']].sum()
+    report.loc[len(report)] = ['Total', total['Default (MB)'], total['Compact (MB)']]
+    return report.round(2)
+
+
+def preprocess(data, chunk_size=CHUNK_SIZE, export_format=None, compact=False, lazy=False):
+    """Parse a WhatsApp chat export into a DataFrame.
+
+    The export is read line by line and converted chunk_size messages at a time, so apart
+    from the result only one chunk of raw messages is held in memory. Unless export_format
+    names one of FORMATS, the format is detected from the first SAMPLE_SIZE characters.
+    With compact=True the result uses the compact schema (see compact_frame), and with
+    lazy=True the date-part columns are left for derive to add when a view needs them.
+    The format used is recorded in df.attrs['export_format'].
+    """
+    lines = open_lines(data)
+    sample = lines.read(SAMPLE_SIZE)
+    # Finish the partially read line and put the sample back in front of the rest
+    sample += lines.readline()
+    if export_format is None:
+        export_format = detect_format(sample)
+    header = FORMATS[export_format]
+
+    chunks = list(iter_chunks(itertools.chain(io.StringIO(sample), lines), header, chunk_size, compact, lazy))
+    if isinstance(lines, io.TextIOWrapper) and lines is not data:
+        # Hand the underlying file back to the caller without closing it
+        lines.detach()
 
+    if not chunks:
+        df = build_frame([], [], [], compact=compact, lazy=lazy)
+    else:
+        df = concat_chunks(chunks)
+    df.attrs['compact'] = compact
+    df.attrs['export_format'] = export_format
     return df
@@ -0,0 +1,76 @@
+import os
+import threading
+from types import MappingProxyType
+
+# Word lists and lexicons are looked up as <name>.txt, first in CHAT_RESOURCE_DIR (for
+# per-deployment lists) and then next to this module, so the working directory does not matter
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CUSTOM_DIR = os.environ.get('CHAT_RESOURCE_DIR')
+
+# Stopword lists used by the word views, comma separated, e.g. "hinglish,english,company"
+STOP_WORD_LISTS = tuple(name.strip() for name in os.environ.get('CHAT_STOP_WORDS', 'hinglish').split(',') if name.strip())
+
+# Sentiment lexicons merged in order, later ones overriding earlier ones, e.g. "sentiment_english,sentiment_hinglish"
+LEXICONS = tuple(name.strip() for name in os.environ.get('CHAT_SENTIMENT_LEXICONS', 'sentiment_english,sentiment_hinglish').split(',') if name.strip())
+
+# path -> (mtime, parsed contents); guarded by _lock since Streamlit runs sessions in threads
+_cache = {}
+_lock = threading.Lock()
+
+
+def path(name):
+    """Return the file of a resource, preferring the custom directory."""
+    for directory in (CUSTOM_DIR, BASE_DIR):
+        if directory:
+            candidate = os.path.join(directory, name + '.txt')
+            if os.path.exists(candidate):
+                return candidate
+    raise FileNotFoundError(f"No resource file {name}.txt in {CUSTOM_DIR or BASE_DIR}")
+
+
+def parse_words(f):
+    """One lowercase word per line; blank lines and lines starting with # are skipped."""
+    return frozenset(line.strip().lower() for line in f if line.strip() and not line.startswith('#'))
+
+
+def parse_lexicon(f):
+    """One 'word<TAB>score' per line, as in the VADER lexicon; further columns are ignored."""
+    lexicon = {}
+    for line in f:
+        if line.strip() and not line.startswith('#'):
+            word, score = line.rstrip('\n').split('\t')[:2]
+            lexicon[word.strip().lower()] = float(score)
+    return MappingProxyType(lexicon)
+
+
+def load(name, parse=parse_words):
+    """Return the parsed contents of a resource, reading its file again only after it changes."""
+    file = path(name)
+    mtime = os.stat(file).st_mtime_ns
+    cached = _cache.get((file, parse))
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _lock:
+        with open(file, 'r', encoding='utf-8') as f:
+            contents = parse(f)
+        _cache[(file, parse)] = (mtime, contents)
+    return contents
+
+
+def stop_words(*names):
+    """Return the union of the given stopword lists, STOP_WORD_LISTS by default, as a frozenset."""
+    lists = [load(name) for name in names or STOP_WORD_LISTS]
+    if len(lists) == 1:
+        return lists[0]
+    return frozenset().union(*lists)
+
+
+def lexicon(*names):
+    """Return the given sentiment lexicons, LEXICONS by default, merged into one read-only word -> score mapping."""
+    lexicons = [load(name, parse_lexicon) for name in names or LEXICONS]
+    if len(lexicons) == 1:
+        return lexicons[0]
+    merged = {}
+    for words in lexicons:
+        merged.update(words)
+    return MappingProxyType(merged)
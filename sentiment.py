@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+import resources
+import workers
+
+try:
+    from textblob import TextBlob
+except ImportError:
+    TextBlob = None
+
+LABELS = ('Negative', 'Neutral', 'Positive')
+
+# Scorer used when none is given: 'lexicon' (built in, vectorized) or 'textblob'
+BACKEND = os.environ.get('CHAT_SENTIMENT_BACKEND', 'lexicon')
+
+# Words are runs of letters, with an apostrophe inside for "don't"; \x00 marks the end of a message
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?|\x00")
+
+# A sentiment word is negated by a negation up to 3 words before it ("not very good") or by a
+# Hinglish post-negation right after it ("accha nahi"), and then counts for NEGATION_SCALAR
+# times its score, as in VADER
+NEGATION_WINDOW = 3
+NEGATION_SCALAR = -0.74
+# Normalizes summed word scores into (-1, 1), as VADER's compound score
+NORMALIZATION_ALPHA = 15
+
+# Polarity of every message scored so far in this process, per backend and message; cleared when it grows too big.
+# Guarded by _lock since Streamlit sessions and the analysis thread pool score concurrently
+MAX_CACHED_SCORES = 1000000
+_scores = {}
+_lock = threading.Lock()
+
+
+def score_textblob(messages):
+    if TextBlob is None:
+        raise ImportError("The 'textblob' sentiment backend needs TextBlob: pip install textblob")
+    return [TextBlob(message).sentiment.polarity for message in messages]
+
+
+def score_lexicon(messages, lexicon=None, negations=None, post_negations=None):
+    """Score messages in (-1, 1) from word valences, with array operations over the whole column.
+
+    All messages are tokenized in one regex pass; lexicon lookups run once per distinct
+    word, and per-message sums are taken with bincount.
+    """
+    lexicon = resources.lexicon() if lexicon is None else lexicon
+    negations = resources.load('sentiment_negations') if negations is None else negations
+    post_negations = resources.load('sentiment_post_negations') if post_negations is None else post_negations
+    text = '\x00'.join(message.replace('\x00', '') for message in messages)
+    tokens = TOKEN_PATTERN.findall(text.lower().replace('’', "'") + '\x00')
+    codes, vocabulary = pd.factorize(np.array(tokens, dtype=object))
+    ends = np.fromiter((word == '\x00' for word in vocabulary), dtype=bool, count=len(vocabulary))[codes]
+    message_ids = np.cumsum(ends) - ends
+    scores = np.fromiter((lexicon.get(word, 0.0) for word in vocabulary), dtype=float, count=len(vocabulary))[codes]
+    negation = np.fromiter((word in negations for word in vocabulary), dtype=bool, count=len(vocabulary))[codes]
+    post_negation = np.fromiter((word in post_negations for word in vocabulary), dtype=bool, count=len(vocabulary))[codes]
+
+    negated = np.zeros(len(tokens), dtype=bool)
+    for offset in range(1, NEGATION_WINDOW + 1):
+        negated[offset:] |= negation[:-offset] & (message_ids[offset:] == message_ids[:-offset])
+    negated[:-1] |= post_negation[1:] & (message_ids[:-1] == message_ids[1:])
+    scores = np.where(negated & ~negation & ~post_negation, scores * NEGATION_SCALAR, scores)
+
+    totals = np.bincount(message_ids, weights=scores, minlength=len(messages))[:len(messages)]
+    return (totals / np.sqrt(totals * totals + NORMALIZATION_ALPHA)).tolist()
+
+
+BACKENDS = {
+    'lexicon': score_lexicon,
+    'textblob': score_textblob,
+}
+
+# Backends slow enough per message to be worth a worker pool
+PARALLEL_BACKENDS = {'textblob'}
+
+
+def polarity(messages, backend=None):
+    """Return the polarity of each message as a float array, from -1 (negative) to 1 (positive).
+
+    Each distinct message is scored once, and only if it was not scored before in this
+    process; the slower backends score new messages in batches across the worker pool.
+    """
+    backend = backend or BACKEND
+    codes, distinct = pd.factorize(pd.Series(messages, dtype=object))
+    # This call's scores, so other threads clearing the cache cannot take them away
+    with _lock:
+        cached = _scores.setdefault(backend, {})
+        known = {message: cached[message] for message in distinct if message in cached}
+    missing = [message for message in distinct if message not in known]
+    if backend in PARALLEL_BACKENDS:
+        new_scores = dict(zip(missing, workers.map_batches(BACKENDS[backend], missing)))
+    else:
+        new_scores = dict(zip(missing, BACKENDS[backend](missing)))
+    known.update(new_scores)
+    with _lock:
+        if len(cached) + len(new_scores) > MAX_CACHED_SCORES:
+            cached.clear()
+        cached.update(new_scores)
+    return np.array([known[message] for message in distinct], dtype=float)[codes]
+
+
+def labels(scores):
+    """'Positive', 'Negative' or 'Neutral' for each polarity score."""
+    return np.asarray(LABELS, dtype=object)[np.sign(scores).astype(int) + 1]
+
+
+def sentiment_counts(messages, backend=None):
+    """Count the messages per sentiment label, most common first."""
+    return pd.Series(labels(polarity(messages, backend)), name='sentiment').value_counts()
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+
+# A pause longer than this between two messages ends a conversation session
+IDLE_GAP = pd.Timedelta(minutes=float(os.environ.get('CHAT_SESSION_GAP_MINUTES', 60)))
+
+# System messages (joins, leaves, ...) are not part of conversations
+SYSTEM_USER = 'group_notification'
+
+
+def messages(df):
+    """The user messages of a chat as (dates, user codes, users), in time order.
+
+    Exports are already in time order, so sorting is only done when they are not.
+    """
+    df = df.loc[df['user'] != SYSTEM_USER, ['date', 'user']]
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='stable')
+    codes, users = pd.factorize(df['user'])
+    return df['date'].to_numpy(dtype='datetime64[ns]'), codes, pd.Index(np.asarray(users, dtype=object), name='user')
+
+
+def session_starts(dates, gap=IDLE_GAP):
+    """Mark the messages that start a session: the first one and any after a pause longer than gap."""
+    starts = np.ones(len(dates), dtype=bool)
+    starts[1:] = np.diff(dates) > gap.to_timedelta64()
+    return starts
+
+
+def sessions(df, gap=IDLE_GAP, user=None):
+    """One row per conversation session: start, end, duration, messages, participants and who started it.
+
+    With user, only the sessions that user wrote in are kept.
+    """
+    dates, codes, users = messages(df)
+    starts = session_starts(dates, gap)
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:] - 1, len(dates) - 1)[:len(first)]
+    session = np.cumsum(starts) - 1
+    # Distinct (session, user) pairs, counted per session
+    pairs = np.unique(session.astype(np.int64) * max(len(users), 1) + codes)
+    participants = np.bincount(pairs // max(len(users), 1), minlength=len(first))
+    table = pd.DataFrame({
+        'start': dates[first],
+        'end': dates[last],
+        'duration': dates[last] - dates[first],
+        'messages': last - first + 1,
+        'participants': participants,
+        'started_by': users[codes[first]],
+    }).rename_axis('session')
+    if user is None:
+        return table
+    return table.iloc[np.unique(session[codes == users.get_indexer([user])[0]])]
+
+
+def replies(df, gap=IDLE_GAP):
+    """Every message that answers someone else, with the user answered and how long the answer took.
+
+    A message is taken as a reply to the message before it when a different user sent that
+    one and no session boundary lies between them.
+    """
+    dates, codes, users = messages(df)
+    answered = ~session_starts(dates, gap)
+    answered[1:] &= codes[1:] != codes[:-1]
+    position = np.flatnonzero(answered)
+    return pd.DataFrame({
+        'user': users[codes[position]],
+        'replied_to': users[codes[position - 1]],
+        'latency': dates[position] - dates[position - 1],
+    })
+
+
+def reply_pairs(replies):
+    """How often each user (rows) replied to each other user (columns)."""
+    return pd.crosstab(replies['user'], replies['replied_to'])
+
+
+def response_times(replies):
+    """Replies per user with their median and mean latency, fastest first."""
+    latency = replies['latency'].dt.total_seconds() / 60
+    stats = latency.groupby(replies['user']).agg(['count', 'median', 'mean'])
+    stats.columns = ['replies', 'median_minutes', 'mean_minutes']
+    return stats.sort_values('median_minutes', kind='stable')
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Bucket sizes a timeline can use, finest first: (name, pandas frequency)
+GRANULARITIES = (
+    ('day', 'D'),
+    ('week', 'W-MON'),
+    ('month', 'MS'),
+    ('quarter', 'QS'),
+)
+
+# The finest granularity with at most MAX_POINTS buckets over the requested range is used, so every
+# bucket is drawn and that is all the browser receives
+MAX_POINTS = int(os.environ.get('CHAT_TIMELINE_POINTS', 500))
+
+
+def daily_counts(dates):
+    """Count a datetime column per calendar day, as a Series sorted by day."""
+    return dates.dt.normalize().value_counts().sort_index().rename_axis('day').rename('count')
+
+
+def lttb(x, y, threshold):
+    """Positions of the points Largest-Triangle-Three-Buckets keeps to draw y over x with threshold points.
+
+    The first and last points are always kept; the others are split into equal buckets and
+    each keeps the point making the largest triangle with the previous kept point and the
+    mean of the next bucket, which preserves peaks and dips.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.intp), n)
+    kept = np.empty(threshold, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_x = x[stop:edges[bucket + 2]].mean()
+        next_y = y[stop:edges[bucket + 2]].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = kept[bucket + 1] = start + np.argmax(areas)
+    return kept
+
+
+def buckets(daily, frequency):
+    return daily.resample(frequency, label='left', closed='left').sum().astype('int64')
+
+
+def resample(daily, start=None, end=None, name=None, max_points=MAX_POINTS):
+    """Sum daily counts into buckets over [start, end], with empty buckets as 0.
+
+    Unless given, the granularity is the finest with at most max_points buckets. Only when
+    even quarters are too many are they thinned out to max_points with LTTB. Returns
+    (granularity, counts), with counts indexed by the first day of each bucket.
+    """
+    daily = daily.loc[start:end]
+    if daily.empty:
+        return name or GRANULARITIES[0][0], daily.astype('int64')
+    for bucket, frequency in GRANULARITIES:
+        if name in (None, bucket):
+            counts = buckets(daily, frequency)
+            if name is not None or len(counts) <= max_points:
+                break
+    return bucket, counts.iloc[lttb(counts.index.asi8, counts.to_numpy(), max_points)]
@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Processes used for CPU-bound per-message work such as link extraction and sentiment scoring
+WORKERS = int(os.environ.get('CHAT_WORKERS', os.cpu_count() or 1))
+
+# Threads for work that mostly runs in pandas/numpy code releasing the GIL, or waits on processes
+THREADS = int(os.environ.get('CHAT_THREADS', 2 * WORKERS))
+
+# Worker processes start from a clean server process rather than a fork of this one, since forking
+# while Streamlit's and the analysis pool's threads hold locks can deadlock the children
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Below this many items a worker pool costs more than it saves
+PARALLEL_MIN_ITEMS = 20000
+
+# Pools shared by every session of the process, created on first use
+_pools = {}
+_lock = threading.Lock()
+
+
+def thread_pool():
+    key = 'threads'
+    with _lock:
+        if key not in _pools:
+            _pools[key] = ThreadPoolExecutor(THREADS, thread_name_prefix='analysis')
+        return _pools[key]
+
+
+def process_pool():
+    """The shared process pool, or None when there is only one worker."""
+    if WORKERS <= 1:
+        return None
+    key = 'processes'
+    with _lock:
+        if key not in _pools:
+            _pools[key] = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+        return _pools[key]
+
+
+def map_batches(func, items, workers=WORKERS, min_items=PARALLEL_MIN_ITEMS):
+    """Return func(items) computed in one batch per worker process, or in this process for small inputs.
+
+    func must be a module-level function taking a list and returning a list of the same length.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) < min_items:
+        return func(items)
+    size = -(-len(items) // workers)
+    batches = [items[start:start + size] for start in range(0, len(items), size)]
+    if workers == WORKERS:
+        return [result for batch in process_pool().map(func, batches) for result in batch]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+        return [result for batch in pool.map(func, batches) for result in batch]